@@ -0,0 +1,137 @@
+"""
+Checks that concurrent installations don't fail (or hang until the sqlite busy timeout) with "database is locked".
+
+Each installation runs the same database work of install_mod, on a temporary database: the Mod and ModRevision
+entries and the "installing" status are saved with a first commit (the ModRevision query autoflushes the new Mod),
+the installation is journaled and its progress updated, then the dependencies, the downloaded archive and the
+"installed" status are saved. Like install_mod with install_deps, each mod installs its dependencies on a pool of
+workers, while the other mods are installed by other threads.
+The work that install_mod does between the first write and the commit of each step (logging, status messages) is
+simulated with a delay of --delay seconds.
+
+Run it from the repository root:
+    python -m benchmarks.concurrent_install_check [--mods 8] [--dependencies 2] [--rounds 5] [--delay 0.005]
+"""
+import argparse
+import datetime
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import mkdtemp
+from types import SimpleNamespace
+
+# the database is created into the app folder of the home directory: use a temporary one
+_home = mkdtemp(prefix="concurrent_install_check-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = _home
+
+import smods_manager.app  # noqa: E402
+from db import SSession  # noqa: E402
+from db.jobs import JOB_STEPS  # noqa: E402
+from db.model import Mod  # noqa: E402
+from db.mods import create_mod_if_not_exists, create_revision_if_not_exists  # noqa: E402
+from tasks.journal import JobJournal  # noqa: E402
+
+PROGRESS_UPDATES = 5
+
+
+def install(mod_id: str, dependency_ids: list[str], workers: int, delay: float) -> float:
+    """
+    Installs the dependencies concurrently, then the mod. Returns the seconds spent into the database work of the mod
+    """
+    if dependency_ids:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(install, dependency_id, [], workers, delay) for dependency_id in dependency_ids]
+            for future in futures:
+                future.result()
+
+    start = time.monotonic()
+    db = SSession()
+    journal = None
+    try:
+        mod = SimpleNamespace(id=mod_id, name=f"Mod {mod_id}")
+        revision = SimpleNamespace(id=f"{mod_id}-r", name="1.0", date=datetime.datetime.now(), download_url="",
+                                   filename=f"{mod_id}.zip")
+
+        db_mod, is_new = create_mod_if_not_exists(db, mod)
+        if is_new:
+            db.add(db_mod)
+        db_revision, is_new = create_revision_if_not_exists(db, revision, db_mod)
+        if is_new:
+            db.add(db_revision)
+            with db.no_autoflush:
+                db_mod.revisions.append(db_revision)
+        db_mod.set_installed(db_revision, status="installing")
+        time.sleep(delay)
+        db.commit()
+
+        journal = JobJournal(mod_id, revision.id, bool(dependency_ids))
+        for step in (JOB_STEPS.DOWNLOAD, JOB_STEPS.UNZIP, JOB_STEPS.COPY):
+            journal.step(step)
+            for i in range(PROGRESS_UPDATES):
+                journal.update(done_bytes=i, total_bytes=PROGRESS_UPDATES)
+
+        for dependency_id in dependency_ids:
+            db_dependency = db.query(Mod).filter_by(id=dependency_id).first()
+            if db_dependency and db_dependency not in db_mod.dependencies:
+                db_mod.add_dependency(db_dependency)
+        time.sleep(delay)
+        db.commit()
+
+        db_mod.add_downloaded(db_revision, f"{mod_id}.zip")
+        db_mod.installed_revision_association.status = "installed"
+        time.sleep(delay)
+        db.commit()
+    finally:
+        if journal:
+            journal.finish()
+        SSession.remove()
+
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mods", type=int, default=8, help="mods installed concurrently")
+    parser.add_argument("--dependencies", type=int, default=2, help="dependencies of each mod")
+    parser.add_argument("--workers", type=int, default=2, help="dependency workers of each mod")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--delay", type=float, default=0.005, help="seconds between the first write and the commit")
+    args = parser.parse_args()
+
+    smods_manager.app.generate_app_folders()
+    smods_manager.app.update_database()
+
+    errors = []
+    durations = []
+    lock = threading.Lock()
+
+    def run(mod_id, dependency_ids):
+        try:
+            duration = install(mod_id, dependency_ids, args.workers, args.delay)
+            with lock:
+                durations.append(duration)
+        except Exception as e:
+            with lock:
+                errors.append(f"{mod_id}: {type(e).__name__}: {e}")
+
+    start = time.monotonic()
+    for r in range(args.rounds):
+        threads = [threading.Thread(target=run, args=(f"{r}-{m}", [f"{r}-{m}-d{d}" for d in range(args.dependencies)]))
+                   for m in range(args.mods)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    print(f"{args.rounds} rounds of {args.mods} mods with {args.dependencies} dependencies: "
+          f"{time.monotonic() - start:.2f}s, slowest install {max(durations, default=0):.2f}s, {len(errors)} errors")
+    for error in errors:
+        print(error)
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
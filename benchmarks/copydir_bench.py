@@ -0,0 +1,92 @@
+"""
+Benchmark of utils.utils.copydir with progress reporting, on synthetic trees of small files.
+
+Each tree size is copied with a progress callback, and the time per file is printed: since the progress is tracked
+with a running byte counter, the time per file should stay (roughly) the same while the number of files grows.
+With --rewalk, each size is also copied re-computing the progress from the size of the destination folder after
+every file (what copydir did before), which grows quadratically with the number of files.
+
+Run it from the repository root:
+    python -m benchmarks.copydir_bench [--files 5000] [--file-size 4096] [--workers 1] [--rewalk]
+"""
+import argparse
+import os
+import shutil
+import time
+from shutil import copy2, copytree
+from tempfile import mkdtemp
+
+from utils.utils import copydir, folder_size
+
+FOLDERS = 50  # the files of a tree are spread over this number of sub folders
+
+
+def make_tree(root: str, files: int, file_size: int) -> str:
+    src = os.path.join(root, "src", "SyntheticAsset")
+    data = os.urandom(file_size)
+    for i in range(files):
+        folder = os.path.join(src, f"folder_{i % FOLDERS:02d}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"file_{i:05d}.bin"), "wb") as f:
+            f.write(data)
+
+    return os.path.join(root, "src")
+
+
+def copy_counter(src: str, dest: str, workers: int) -> int:
+    calls = 0
+
+    def callback(copied, total):
+        nonlocal calls
+        calls += 1
+
+    copydir(src, dest, callback=callback, workers=workers)
+    return calls
+
+
+def copy_rewalk(src: str, dest: str) -> int:
+    calls = 0
+    copying_folder = os.listdir(src)[0]
+
+    def copy2_callback(s, d):
+        nonlocal calls
+        copy2(s, d)
+        folder_size(os.path.join(dest, copying_folder))
+        calls += 1
+
+    copytree(src, dest, copy_function=copy2_callback, dirs_exist_ok=True)
+    return calls
+
+
+def bench(name: str, copy_fn, src: str, root: str, files: int):
+    dest = os.path.join(root, f"dest_{name}")
+    start = time.perf_counter()
+    calls = copy_fn(src, dest)
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(dest)
+
+    assert calls == files, f"{calls} progress updates for {files} files"
+    print(f"{name:>8} {files:>7} files {elapsed:>9.3f}s {elapsed / files * 1e6:>9.1f}us/file")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5000, help="files of the largest tree")
+    parser.add_argument("--file-size", type=int, default=4096, help="size in bytes of each file")
+    parser.add_argument("--workers", type=int, default=1, help="copydir workers")
+    parser.add_argument("--rewalk", action="store_true", help="also benchmark the re-walking progress")
+    args = parser.parse_args()
+
+    for files in (args.files // 4, args.files // 2, args.files):
+        root = mkdtemp(prefix="copydir_bench-")
+        try:
+            src = make_tree(root, files, args.file_size)
+            bench("copydir", lambda s, d: copy_counter(s, d, args.workers), src, root, files)
+            if args.rewalk:
+                bench("rewalk", copy_rewalk, src, root, files)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Checks that utils.download.download_file resumes interrupted downloads with HTTP Range requests.
+
+A local http.server serves a random archive and supports Range requests. Two downloads are checked:
+- "dropped": the server closes the connection in the middle of the first response body, so download_file must retry
+  and resume the .part file with a Range request;
+- "resumed": a .part file with the first half of the archive already exists (e.g. the app was closed during the
+  download), so the first request must already be a Range request.
+In both cases the downloaded file must be renamed to its final name, with the size and the sha256 of the archive.
+
+Run it from the repository root:
+    python -m benchmarks.download_resume_check [--size 1048576]
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from tempfile import mkdtemp
+
+import requests
+
+from utils.download import download_file, part_path
+from utils.utils import file_sha256
+
+
+class ArchiveHandler(BaseHTTPRequestHandler):
+    archive: bytes = b""
+    drop_first: bool = False  # close the connection in the middle of the body of the first response
+    ranges: list = []  # Range header of each request (None if missing)
+
+    def do_GET(self):
+        range_header = self.headers.get("Range")
+        self.ranges.append(range_header)
+
+        start = 0
+        match = re.match(r"bytes=(\d+)-$", range_header or "")
+        if match:
+            start = int(match.group(1))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(self.archive) - 1}/{len(self.archive)}")
+        else:
+            self.send_response(200)
+        body = self.archive[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if self.drop_first and len(self.ranges) == 1:
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def check(name: str, archive: bytes, drop_first: bool, partial: bool) -> bool:
+    ArchiveHandler.archive = archive
+    ArchiveHandler.drop_first = drop_first
+    ArchiveHandler.ranges = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ArchiveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    folder = mkdtemp(prefix="download_resume_check-")
+    path = os.path.join(folder, "archive.zip")
+    if partial:
+        with open(part_path(path), "wb") as f:
+            f.write(archive[:len(archive) // 2])
+
+    retries = []
+    try:
+        result = download_file(f"http://127.0.0.1:{server.server_port}/archive.zip", path,
+                               retry_callback=lambda attempt, delay, reason: retries.append(reason),
+                               backoff=0, session=requests.Session())
+
+        errors = []
+        if result != path:
+            errors.append(f"download_file returned {result}")
+        if os.path.exists(part_path(path)):
+            errors.append(".part file not renamed")
+        if not os.path.isfile(path) or os.path.getsize(path) != len(archive):
+            errors.append(f"wrong size: {os.path.getsize(path) if os.path.isfile(path) else None}")
+        elif file_sha256(path) != hashlib.sha256(archive).hexdigest():
+            errors.append("wrong sha256")
+        expected_range = f"bytes={len(archive) // 2}-"
+        if expected_range not in ArchiveHandler.ranges:
+            errors.append(f"no {expected_range} request")
+
+        print(f"{name:>8}: requests {ArchiveHandler.ranges}, {len(retries)} retries: "
+              f"{'OK' if not errors else ', '.join(errors)}")
+        return not errors
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1024 * 1024, help="size in bytes of the archive")
+    args = parser.parse_args()
+
+    archive = os.urandom(args.size)
+    results = [check("dropped", archive, drop_first=True, partial=False),
+               check("resumed", archive, drop_first=False, partial=True)]
+
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
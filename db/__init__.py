@@ -1,16 +1,46 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData, create_engine
+from sqlalchemy import MetaData, create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 
-from smods_manager.app import db_path
+from smods_manager.app import db_path, DB_TUNING
 
 db_path = db_path
 metadata = MetaData()
 Base = declarative_base(metadata=metadata)
 
 flask_db = SQLAlchemy(metadata=metadata)
-engine = create_engine(f'sqlite:///{db_path}')
+
+# With DB_TUNING enabled, the engine is configured for concurrent access from the install threads and the Flask
+# requests: connections can be shared between threads through a pool, and a writer waits up to "timeout" seconds
+# (the sqlite busy timeout) for the database lock instead of immediately failing. Write transactions take the lock
+# when they start (see begin_immediate), so the busy timeout is the only wait of a writer
+ENGINE_OPTIONS = {
+    "connect_args": {"check_same_thread": False, "timeout": 30},
+    "poolclass": QueuePool,
+    "pool_size": 10,
+    "max_overflow": 10
+} if DB_TUNING else {}
+
+# WAL journaling lets readers go on while a task is writing. With WAL, synchronous=NORMAL is still safe against
+# corruption and avoids a fsync at each commit
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,  # negative values are KiB
+    "temp_store": "MEMORY"
+} if DB_TUNING else {}
+
+engine = create_engine(f'sqlite:///{db_path}', **ENGINE_OPTIONS)
+
+
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
 
 
 # We have to create a SQLAlchemy scoped session for the install_mod task to reuse the same session object in each
@@ -20,3 +50,16 @@ engine = create_engine(f'sqlite:///{db_path}')
 # https://docs.sqlalchemy.org/en/13/orm/contextual.html
 session_factory = sessionmaker(bind=engine)
 SSession = scoped_session(session_factory)
+
+# SQLite allows only one writer at a time. Tasks running in parallel threads (e.g. the dependencies installed by
+# install_mod) write concurrently, so the transaction that writes (the first INSERT/UPDATE/DELETE, including the ones
+# sent by an autoflush) is started with BEGIN IMMEDIATE: the sqlite write lock is taken (waiting up to the busy timeout)
+# before any statement of the transaction, and it's the only lock a writer waits for, so two writers can't deadlock.
+# The lock is released by sqlite itself when the transaction is committed or rolled back, or the connection closed.
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def begin_immediate(conn, cursor, statement, parameters, context, executemany):
+    if not cursor.connection.in_transaction and statement.lstrip().upper().startswith(_WRITE_STATEMENTS):
+        cursor.execute("BEGIN IMMEDIATE")
@@ -1,3 +1,4 @@
+import threading
 from typing import Tuple, List
 
 from sqlalchemy.orm import Session
@@ -9,44 +10,108 @@ from db.model import Configuration
 class CONFIGURATION_KEYS(object):
     CS_INSTALL_DIR = "cs.install.dir"
     CS_DATA_DIR = "cs.data.dir"
+    COPY_WORKERS = "copy.workers"
+    INSTALL_MODE = "install.mode"
+    DEPENDENCY_WORKERS = "install.dependency.workers"
+    BATCH_WORKERS = "install.batch.workers"
+    TASK_WORKERS = "tasks.workers"
+    PIPELINE_DOWNLOAD_WORKERS = "pipeline.download.workers"
+    PIPELINE_EXTRACT_WORKERS = "pipeline.extract.workers"
+    PIPELINE_INSTALL_WORKERS = "pipeline.install.workers"
+    DOWNLOAD_CACHE_SIZE = "download.cache.size"  # MiB, 0 for no limit
+    STATUS_PUBLISH_RATE = "status.publish.rate"  # progress messages per second
+
+
+class INSTALL_MODES(object):
+    DIRECT = "direct"  # the zip is extracted directly into the target folder
+    COPY = "copy"  # the zip is extracted into a temporary folder, then copied into the target folder
+
+
+DEFAULT_COPY_WORKERS = 1  # copying small files in parallel is slower than serially (see benchmarks/copydir_bench.py)
+DEFAULT_DEPENDENCY_WORKERS = 4
+DEFAULT_BATCH_WORKERS = 4
+DEFAULT_TASK_WORKERS = 4
+DEFAULT_PIPELINE_DOWNLOAD_WORKERS = 2
+DEFAULT_PIPELINE_EXTRACT_WORKERS = 1
+DEFAULT_PIPELINE_INSTALL_WORKERS = 1
+DEFAULT_DOWNLOAD_CACHE_SIZE = 4096
+DEFAULT_STATUS_PUBLISH_RATE = 10
+
+
+# Configurations are read from the database only once, and cached until the next write
+_configurations: dict[str, str | None] | None = None
+_configurations_lock = threading.RLock()
+
+
+def _cached_configurations() -> dict[str, str | None]:
+    global _configurations
+    with _configurations_lock:
+        if _configurations is None:
+            with Session(engine) as sess:
+                _configurations = {config.key: config.value for config in sess.query(Configuration).all()}
+
+        return _configurations
+
+
+def invalidate_configurations():
+    """
+    Drops the cached configurations, so they will be read again from the database on the next access
+    """
+    global _configurations
+    with _configurations_lock:
+        _configurations = None
 
 
 def get_configuration(key: str) -> Configuration:
-    with Session(engine) as sess:
-        return sess.query(Configuration).filter_by(key=key).first()
+    """
+    Returns a (transient) copy of the configuration with the given key, or None if it doesn't exist
+    """
+    configurations = _cached_configurations()
+    if key not in configurations:
+        return None
+
+    return Configuration(key, configurations[key])
+
+
+def get_configuration_int(key: str, default: int) -> int:
+    """
+    Returns the value of the configuration key as an integer, or default if the key is missing or not a valid integer
+    """
+    config = get_configuration(key)
+    try:
+        return int(config.value) if config and config.value is not None else default
+    except ValueError:
+        return default
 
 
 def get_all_configurations() -> list[Configuration]:
-    with Session(engine) as sess:
-        return sess.query(Configuration).all()
+    return [Configuration(key, value) for key, value in _cached_configurations().items()]
 
 
 def set_configuration(key, value):
-    with Session(engine) as sess:
-        config = get_configuration(key)
-        if not config:
-            config = Configuration(key, value)
-            sess.add(config)
-        else:
-            config.value = value
-
-        sess.commit()
+    set_configuration_list([(key, value)])
 
 
 def set_configuration_list(key_value_tuples_list: List[Tuple[str, str]]):
+    """
+    Saves all the configurations with a single query and a single commit
+    """
+    keys = [key for key, _ in key_value_tuples_list]
     with Session(engine) as sess:
+        configs = {config.key: config for config in sess.query(Configuration).filter(Configuration.key.in_(keys))}
         for key, value in key_value_tuples_list:
-            # we repeat the code of set_configuration to avoid to make multiple commits
-            config = get_configuration(key)
+            config = configs.get(key)
             if not config:
                 config = Configuration(key, value)
+                configs[key] = config
                 sess.add(config)
             else:
                 config.value = value
 
         sess.commit()
 
+    invalidate_configurations()
+
 
 def set_configuration_object(key_value_object: dict):
     set_configuration_list([(key, value) for key, value in key_value_object.items()])
-
@@ -0,0 +1,65 @@
+import datetime
+
+from sqlalchemy.orm import Session
+
+from db import engine
+from db.model import InstallJob
+
+
+class JOB_STEPS(object):
+    DEPENDENCIES = "dependencies"
+    DOWNLOAD = "download"
+    UNZIP = "unzip"
+    COPY = "copy"
+    INTERRUPTED = "interrupted"  # set by the startup recovery on the jobs that can be resumed
+
+
+def start_install_job(mod_id: str, revision_id: str, install_deps: bool):
+    """
+    Journals a new installation of the mod, replacing the job of a previous (interrupted) installation
+    """
+    with Session(engine) as sess:
+        job = sess.get(InstallJob, mod_id)
+        attempts = job.attempts if job and job.step == JOB_STEPS.INTERRUPTED else 0
+        if job:
+            sess.delete(job)
+            sess.flush()
+
+        job = InstallJob(mod_id, revision_id, JOB_STEPS.DEPENDENCIES, install_deps=install_deps)
+        job.attempts = attempts
+        job.updated_at = datetime.datetime.now()
+        sess.add(job)
+
+        sess.commit()
+
+
+def update_install_job(mod_id: str, **fields):
+    with Session(engine) as sess:
+        job = sess.get(InstallJob, mod_id)
+        if not job:
+            return
+
+        for field, value in fields.items():
+            setattr(job, field, value)
+        job.updated_at = datetime.datetime.now()
+
+        sess.commit()
+
+
+def finish_install_job(mod_id: str):
+    """
+    Removes the job from the journal, when the installation ends (successfully or not)
+    """
+    with Session(engine) as sess:
+        job = sess.get(InstallJob, mod_id)
+        if job:
+            sess.delete(job)
+            sess.commit()
+
+
+def get_install_jobs(step: str = None) -> list[InstallJob]:
+    with Session(engine) as sess:
+        query = sess.query(InstallJob)
+        if step:
+            query = query.filter_by(step=step)
+        return query.all()
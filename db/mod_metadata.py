@@ -0,0 +1,37 @@
+import datetime
+import json
+
+from sqlalchemy.orm import Session
+
+from db import engine
+from db.model import ModMetadata
+
+
+class METADATA_KINDS(object):
+    BASE = "base"
+    FULL = "full"
+
+
+def get_mod_metadata(mod_id: str, kind: str) -> tuple[dict, datetime.datetime] | None:
+    """
+    Returns the stored payload of the mod and the time it has been fetched, or None if it has never been stored
+    """
+    with Session(engine) as sess:
+        metadata = sess.get(ModMetadata, (mod_id, kind))
+        if not metadata:
+            return None
+
+        return json.loads(metadata.payload), metadata.fetched_at
+
+
+def save_mod_metadata(mod_id: str, kind: str, payload: dict):
+    with Session(engine) as sess:
+        metadata = sess.get(ModMetadata, (mod_id, kind))
+        if not metadata:
+            metadata = ModMetadata(mod_id, kind, None, None)
+            sess.add(metadata)
+
+        metadata.payload = json.dumps(payload)
+        metadata.fetched_at = datetime.datetime.now()
+
+        sess.commit()
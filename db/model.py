@@ -1,4 +1,6 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime
+import datetime
+
+from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Text, Boolean
 from sqlalchemy.orm import relationship
 from sqlalchemy_serializer import SerializerMixin
 
@@ -23,10 +25,16 @@ class DownloadedRevisions(Base, SerializerMixin):
     mod_id = Column(ForeignKey("Mod.id"), primary_key=True)
     revision_id = Column(ForeignKey("ModRevision.id"), primary_key=True)
     path = Column(String(255))
+    sha256 = Column(String(64), nullable=True)  # None for the archives downloaded before the download store
+    size = Column(Integer, nullable=True)
+    last_access = Column(DateTime, nullable=True)  # last time the archive has been downloaded or reused
     revision = relationship('ModRevision')
 
-    def __init__(self, path):
+    def __init__(self, path, sha256=None, size=None):
         self.path = path
+        self.sha256 = sha256
+        self.size = size
+        self.last_access = datetime.datetime.now()
 
 
 class ModsPlaylists(Base, SerializerMixin):
@@ -87,17 +95,20 @@ class Mod(Base, SerializerMixin):
         self.id = id
         self.name = name
 
-    def add_downloaded(self, revision: ModRevision, path: str):
+    def add_downloaded(self, revision: ModRevision, path: str, sha256: str = None, size: int = None):
         already_added = None
         for dr in self.downloaded_revisions_association:
             if dr.revision.id == revision.id:
-                already_added = dr.revision
+                already_added = dr
                 break
 
         if already_added:
             already_added.path = path
+            already_added.sha256 = sha256
+            already_added.size = size
+            already_added.last_access = datetime.datetime.now()
         else:
-            dr = DownloadedRevisions(path=path)
+            dr = DownloadedRevisions(path=path, sha256=sha256, size=size)
             dr.revision = revision
             self.downloaded_revisions_association.append(dr)
 
@@ -136,3 +147,43 @@ class Configuration(Base, SerializerMixin):
     def __init__(self, key, value=None):
         self.key = key
         self.value = value
+
+
+class ModMetadata(Base, SerializerMixin):
+    __tablename__ = "ModMetadata"
+    mod_id = Column(String(20), primary_key=True)
+    kind = Column(String(10), primary_key=True)  # base / full
+    payload = Column(Text, nullable=False)  # json of the ModBaseSchema / FullModSchema dump
+    fetched_at = Column(DateTime, nullable=False)
+
+    def __init__(self, mod_id, kind, payload, fetched_at):
+        self.mod_id = mod_id
+        self.kind = kind
+        self.payload = payload
+        self.fetched_at = fetched_at
+
+
+class InstallJob(Base, SerializerMixin):
+    __tablename__ = "InstallJob"
+    mod_id = Column(ForeignKey("Mod.id"), primary_key=True)  # only one installation at a time can run for a mod
+    revision_id = Column(ForeignKey("ModRevision.id"), nullable=False)
+    install_deps = Column(Boolean, nullable=False, default=False)
+    install_mode = Column(String(10), nullable=True)
+    step = Column(String(20), nullable=False)
+    zip_path = Column(String(255), nullable=True)  # set when the archive has been completely downloaded
+    work_path = Column(String(255), nullable=True)  # temporary or staging folder the archive is unzipped into
+    created_path = Column(String(255), nullable=True)  # folder created into the target folder by the installation
+    done_bytes = Column(Integer, nullable=False, default=0)  # progress of the current step
+    total_bytes = Column(Integer, nullable=False, default=0)
+    attempts = Column(Integer, nullable=False, default=0)  # times the job has been resumed
+    updated_at = Column(DateTime, nullable=False)
+
+    def __init__(self, mod_id, revision_id, step, install_deps=False, install_mode=None):
+        self.mod_id = mod_id
+        self.revision_id = revision_id
+        self.step = step
+        self.install_deps = install_deps
+        self.install_mode = install_mode
+        self.done_bytes = 0
+        self.total_bytes = 0
+        self.attempts = 0
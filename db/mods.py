@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from smodslib.model import ModBase, ModRevision
 
 from db import engine
-from db.model import Mod, ModRevision as DbModRevision
+from db.model import Mod, ModRevision as DbModRevision, ModsPlaylists, Playlist
 
 
 def create_mod_if_not_exists(session, mod: ModBase):
@@ -47,3 +47,46 @@ def get_installed_mods() -> list[Mod]:
 def get_installed_revision(mod_id) -> ModRevision:
     with Session(engine) as sess:
         return sess.query(Mod).filter_by(id=mod_id).first().installed_revision_association.revision
+
+
+def get_known_dependencies(mod_id) -> list[str] | None:
+    """
+    Returns the ids of the dependencies saved into the database for an installed mod, or None if the mod is not
+    installed or no dependency has been saved for it (i.e. they must be retrieved from the remote site)
+    """
+    with Session(engine) as sess:
+        db_mod = sess.query(Mod).filter_by(id=mod_id).first()
+        if not db_mod or not db_mod.installed_revision_association or not db_mod.dependencies:
+            return None
+
+        return [dependency.id for dependency in db_mod.dependencies]
+
+
+def add_dependencies(dependencies: dict[str, list[str]]):
+    """
+    Saves into the database the dependencies (mod_id -> dependency ids) of the mods already saved. Dependencies not
+    saved into the database are ignored.
+    """
+    with Session(engine) as sess:
+        for mod_id, dependency_ids in dependencies.items():
+            db_mod = sess.get(Mod, mod_id)
+            if not db_mod:
+                continue
+
+            for dependency_id in dependency_ids:
+                db_dependency = sess.get(Mod, dependency_id)
+                if db_dependency and db_dependency not in db_mod.dependencies:
+                    db_mod.add_dependency(db_dependency)
+
+        sess.commit()
+
+
+def get_playlist_mod_ids(playlist_id) -> list[str] | None:
+    """
+    Returns the ids of the mods into the playlist, or None if the playlist doesn't exist
+    """
+    with Session(engine) as sess:
+        if not sess.get(Playlist, playlist_id):
+            return None
+
+        return [pa.mod_id for pa in sess.query(ModsPlaylists).filter_by(playlist_id=playlist_id).all()]
@@ -5,6 +5,7 @@ import time
 import smods_manager.app
 from smods_manager import create_app
 from smods_websocket.server import WsServer
+from tasks.journal import recover_install_jobs, resume_install_jobs
 
 import multiprocessing
 
@@ -16,6 +17,8 @@ logger = get_logger(__name__)
 def start_flask_app():
     logger.info("Starting Flask server...")
     app = create_app()
+    # the installations recovered at startup (see recover_install_jobs) are resumed by this process, that runs the tasks
+    resume_install_jobs()
     app.run()
 
 
@@ -38,6 +41,11 @@ if __name__ == '__main__':
     if not os.path.exists(smods_manager.app.db_path):
         logger.info("Database initialization")
         smods_manager.app.init_database()
+    else:
+        smods_manager.app.update_database()
+
+        logger.info("Recovering interrupted installations...")
+        recover_install_jobs()
 
     logger.info("Starting processes...")
     p_flask = multiprocessing.Process(target=start_flask_app)
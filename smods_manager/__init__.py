@@ -1,9 +1,11 @@
 from flask import Flask
 from .api import api_bp
 from flask_cors import CORS
+from sqlalchemy.pool import NullPool
 
 from schema import ma as app_ma
-from db import flask_db, db_path
+from db import flask_db, db_path, engine
+from tasks.status_index import status_index
 
 
 def create_app():
@@ -19,8 +21,14 @@ def create_app():
 
     # init sqlalchemy
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    # flask-sqlalchemy doesn't keep its own pool: each connection is checked out from the pool of the engine used by
+    # the tasks, and given back to it when closed
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {"poolclass": NullPool, "creator": engine.raw_connection}
     flask_db.init_app(app)
 
+    # load the mods status index, so status reads don't have to query the database
+    status_index.load()
+
     # register Blueprints
     app.register_blueprint(api_bp, url_prefix='/api')
 
@@ -1,6 +1,7 @@
 from flask import Blueprint
 
-from .app_resources import ModStatusResource, InstallModTask, UninstallModTask
+from .app_resources import ModStatusResource, ModsStatusResource, InstallModTask, BatchInstallModTask, \
+    UninstallModTask, TasksResource, TaskResource, CacheStatsResource, DownloadCacheResource
 from .mod_resources import ModBaseResource, FullModResource, DependencyTreeResource, DownloadUrlResource, \
     SearchResource, OtherRevisionsResource
 from flask_restful import Api
@@ -21,8 +22,14 @@ mods_api.add_resource(DownloadUrlResource, "/downlink/<sid>")
 mods_api.add_resource(SearchResource, "/search")
 
 app_api.add_resource(ModStatusResource, "/status/<sid>")
+app_api.add_resource(ModsStatusResource, "/status")  # mods list as query parameter
 app_api.add_resource(InstallModTask, "/install")  # parameters as POST request body
+app_api.add_resource(BatchInstallModTask, "/install/batch")  # mods list or playlist_id as POST request body
 app_api.add_resource(UninstallModTask, "/uninstall")  # parameter as POST request body
+app_api.add_resource(TasksResource, "/tasks")
+app_api.add_resource(TaskResource, "/tasks/<task_id>")  # DELETE to cancel a queued task
+app_api.add_resource(CacheStatsResource, "/cache")
+app_api.add_resource(DownloadCacheResource, "/downloads/cache")
 
 
 api_bp.register_blueprint(mods_bp)
@@ -1,11 +1,16 @@
-import threading
+import uuid
 
 from flask import request
 from flask_restful import Resource
 
 from schema.app import ModStatusSchema
+from db.mods import get_playlist_mod_ids
 from tasks import uninstall_mod, install_mod
-from tasks.mod_operation_utils import create_status_object
+from tasks.batch import install_batch, batch_channel
+from tasks.download_store import download_cache_usage
+from tasks.manager import task_manager, task_channel, TaskConflictError, TASK_PRIORITIES
+from tasks.mod_operation_utils import create_status_object, create_status_objects
+from utils.cache import caches_stats
 
 
 class ModStatusResource(Resource):
@@ -15,6 +20,16 @@ class ModStatusResource(Resource):
         return dumped
 
 
+class ModsStatusResource(Resource):
+    def get(self):
+        mods = request.args.getlist("mods")
+        if not mods:
+            return {"error": "Missing mods parameter"}, 400
+
+        schema = ModStatusSchema()
+        return {mod_id: schema.dump(so) for mod_id, so in create_status_objects(mods).items()}
+
+
 class InstallModTask(Resource):
     def post(self):
         data = request.json
@@ -23,10 +38,35 @@ class InstallModTask(Resource):
         if "revision_id" not in data.keys():
             return {"error": "missing revision_id parameter"}, 400
 
-        thread = threading.Thread(target=install_mod, args=(data['mod_id'], data['revision_id'], True,))
-        thread.start()
+        try:
+            task = task_manager.submit("install", install_mod, data['mod_id'], data['revision_id'], True,
+                                       mod_id=data['mod_id'])
+        except TaskConflictError as e:
+            return {"error": str(e), "task_id": e.task_id}, 409
+
+        return {"message": "Accepted", "task_id": task.id, "task_channel": task_channel(task.id)}, 202
+
+
+class BatchInstallModTask(Resource):
+    def post(self):
+        data = request.json
+        if "mods" in data.keys():
+            if not isinstance(data["mods"], list) or any("mod_id" not in m for m in data["mods"]):
+                return {"error": "mods parameter must be a list of objects with a mod_id field"}, 400
+            mods = [(m["mod_id"], m.get("revision_id")) for m in data["mods"]]
+        elif "playlist_id" in data.keys():
+            mod_ids = get_playlist_mod_ids(data["playlist_id"])
+            if mod_ids is None:
+                return {"error": f"playlist not found: {data['playlist_id']}"}, 404
+            mods = [(mod_id, None) for mod_id in mod_ids]
+        else:
+            return {"error": "missing mods or playlist_id parameter"}, 400
+
+        batch_id = uuid.uuid4().hex
+        task = task_manager.submit("install_batch", install_batch, batch_id, mods, priority=TASK_PRIORITIES.LOW)
 
-        return {"message": "Accepted"}, 202
+        return {"message": "Accepted", "task_id": task.id, "task_channel": task_channel(task.id), "batch_id": batch_id,
+                "channel": batch_channel(batch_id)}, 202
 
 
 class UninstallModTask(Resource):
@@ -35,7 +75,41 @@ class UninstallModTask(Resource):
         if "mod_id" not in data.keys():
             return {"error": "missing mod_id parameter"}, 400
 
-        thread = threading.Thread(target=uninstall_mod, args=(data['mod_id'],))
-        thread.start()
+        try:
+            task = task_manager.submit("uninstall", uninstall_mod, data['mod_id'], mod_id=data['mod_id'],
+                                       priority=TASK_PRIORITIES.HIGH)
+        except TaskConflictError as e:
+            return {"error": str(e), "task_id": e.task_id}, 409
+
+        return {"message": "Accepted", "task_id": task.id, "task_channel": task_channel(task.id)}, 202
+
+
+class TasksResource(Resource):
+    def get(self):
+        return {"tasks": [task.to_dict() for task in task_manager.list()]}
+
+
+class TaskResource(Resource):
+    def get(self, task_id):
+        task = task_manager.get(task_id)
+        if not task:
+            return {"error": f"task not found: {task_id}"}, 404
+        return task.to_dict()
+
+    def delete(self, task_id):
+        task = task_manager.get(task_id)
+        if not task:
+            return {"error": f"task not found: {task_id}"}, 404
+        if not task_manager.cancel(task_id):
+            return {"error": f"task {task_id} is {task.state}: only queued tasks can be cancelled"}, 409
+        return task.to_dict()
+
+
+class CacheStatsResource(Resource):
+    def get(self):
+        return {"caches": caches_stats()}
+
 
-        return {"message": "Accepted"}, 202
+class DownloadCacheResource(Resource):
+    def get(self):
+        return download_cache_usage()
@@ -1,22 +1,21 @@
 from flask_restful import Resource
 from flask import request
 
-from smodslib import base_mod, full_mod, generate_dependency_tree, generate_download_url_from_id, search
-from smodslib.smods import get_mod_revisions
+from smodslib import generate_download_url_from_id
 
-from smodslib.model import CatalogueParameters, SortByFilter, TimePeriodFilter
-
-from schema.mods import ModDependencySchema, ModBaseSchema, FullModSchema, ModRevisionSchema, ModCatalogueItemSchema
+from schema.mods import ModDependencySchema, ModRevisionSchema, ModCatalogueItemSchema
+from smods_manager.remote import base_mod_payload, full_mod_payload, search, get_mod_revisions
+from tasks.dependencies import resolve_dependencies
 
 
 class ModBaseResource(Resource):
     def get(self, sid):
-        return ModBaseSchema().dump(base_mod(sid))
+        return base_mod_payload(sid)
 
 
 class FullModResource(Resource):
     def get(self, sid):
-        return FullModSchema().dump(full_mod(sid))
+        return full_mod_payload(sid)
 
 
 class DependencyTreeResource(Resource):
@@ -28,7 +27,7 @@ class DependencyTreeResource(Resource):
         else:
             return {"error": "Missing mod id or ids list"}, 400
 
-        return ModDependencySchema(many=True).dump(generate_dependency_tree(mods, recursive=True))
+        return ModDependencySchema(many=True).dump(resolve_dependencies(mods).dependencies())
 
 
 class DownloadUrlResource(Resource):
@@ -51,14 +50,7 @@ class SearchResource(Resource):
         sort = request.args.get("sort")
         period = request.args.get("period")
 
-        filters = None
-
         if not query:
             return {"error": "Missing q parameter"}, 400
 
-        if sort or period:
-            sort = SortByFilter(sort) if sort else None
-            period = TimePeriodFilter(period) if period else None
-            filters = CatalogueParameters(sort=sort, period=period)
-
-        return ModCatalogueItemSchema(many=True).dump(search(query, page, filters))
+        return ModCatalogueItemSchema(many=True).dump(search(query, page, sort, period))
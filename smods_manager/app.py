@@ -7,15 +7,18 @@ from smodslib.model import ModBase
 from utils.utils import win_search_cs_folders
 
 DEBUG = 1
+DB_TUNING = 1  # enables WAL journaling, busy timeout and connection pooling for the sqlite database
 WEBSOCKET_PORT = 5001
 
 app_folder = os.path.join(os.path.expanduser("~"), ".smods_manager")
 db_path = os.path.join(app_folder, 'app.db')
 download_folder = os.path.join(app_folder, "downloads")
+download_store_folder = os.path.join(download_folder, "store")  # downloaded archives, named by their sha256
 
 def init_database():
     from db import metadata, engine
-    from db.app import set_configuration_object, CONFIGURATION_KEYS as conf
+    from db.app import set_configuration_object, CONFIGURATION_KEYS as conf, DEFAULT_COPY_WORKERS, \
+        DEFAULT_DEPENDENCY_WORKERS, DEFAULT_DOWNLOAD_CACHE_SIZE, INSTALL_MODES
 
     metadata.create_all(engine)
 
@@ -30,11 +33,34 @@ def init_database():
 
     default_config = {
         conf.CS_INSTALL_DIR: cs_install_location,
-        conf.CS_DATA_DIR: cs_data_location
+        conf.CS_DATA_DIR: cs_data_location,
+        conf.COPY_WORKERS: str(DEFAULT_COPY_WORKERS),
+        conf.INSTALL_MODE: INSTALL_MODES.DIRECT,
+        conf.DEPENDENCY_WORKERS: str(DEFAULT_DEPENDENCY_WORKERS),
+        conf.DOWNLOAD_CACHE_SIZE: str(DEFAULT_DOWNLOAD_CACHE_SIZE)
     }
     set_configuration_object(default_config)
 
 
+def update_database():
+    """
+    Creates the tables and the (nullable) columns added after the database has been initialized
+    """
+    from sqlalchemy import inspect, text
+    from db import metadata, engine
+
+    metadata.create_all(engine)
+
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+
 def generate_app_folders():
     if not os.path.exists(app_folder):
         print(f"Generating app folder in {app_folder}")
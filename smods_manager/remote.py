@@ -0,0 +1,110 @@
+import datetime
+import threading
+from typing import Callable
+
+import smodslib
+import smodslib.smods
+from marshmallow import Schema
+from smodslib.model import ModBase, ModRevision, CatalogueParameters, SortByFilter, TimePeriodFilter
+
+from db.mod_metadata import get_mod_metadata, save_mod_metadata, METADATA_KINDS
+from schema.mods import ModBaseSchema, FullModSchema
+from utils.cache import cached
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Cached wrappers of the smodslib functions that scrape the remote site. Each function has its own cache, with a TTL
+# tuned on how often the scraped data changes.
+BASE_MOD_TTL = 10 * 60
+FULL_MOD_TTL = 10 * 60
+REVISIONS_TTL = 5 * 60
+SEARCH_TTL = 2 * 60
+
+# mod metadata stored into the database older than this is served as is, but refreshed in background
+METADATA_STALE_AFTER = datetime.timedelta(hours=1)
+
+
+@cached("base_mod", BASE_MOD_TTL, maxsize=512)
+def base_mod(sid: str) -> ModBase:
+    return smodslib.base_mod(sid)
+
+
+@cached("full_mod", FULL_MOD_TTL, maxsize=256)
+def full_mod(sid: str) -> ModBase:
+    return smodslib.full_mod(sid)
+
+
+@cached("get_mod_revisions", REVISIONS_TTL, maxsize=256)
+def get_mod_revisions(sid: str) -> tuple[ModRevision, list[ModRevision]]:
+    return smodslib.smods.get_mod_revisions(sid)
+
+
+@cached("search", SEARCH_TTL, maxsize=128)
+def search(query: str, page=0, sort: str = None, period: str = None) -> list:
+    filters = None
+    if sort or period:
+        filters = CatalogueParameters(sort=SortByFilter(sort) if sort else None,
+                                      period=TimePeriodFilter(period) if period else None)
+
+    return smodslib.search(query, page, filters)
+
+
+_revalidating: set[tuple[str, str]] = set()
+_revalidating_lock = threading.Lock()
+
+
+def _fetch_payload(kind: str, sid: str, fetch: Callable[[str], ModBase], schema: Schema) -> dict:
+    payload = schema.dump(fetch(sid))
+    save_mod_metadata(sid, kind, payload)
+    return payload
+
+
+def _revalidate(kind: str, sid: str, fetch: Callable[[str], ModBase], schema: Schema):
+    with _revalidating_lock:
+        if (kind, sid) in _revalidating:
+            return
+        _revalidating.add((kind, sid))
+
+    def refresh():
+        try:
+            logger.debug(f"Refreshing stale {kind} metadata of mod {sid}")
+            _fetch_payload(kind, sid, fetch, schema)
+        except Exception as e:
+            logger.warning(f"Cannot refresh {kind} metadata of mod {sid}: {e}")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard((kind, sid))
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
+def _mod_payload(kind: str, sid: str, fetch: Callable[[str], ModBase], schema: Schema) -> dict:
+    """
+    Stale-while-revalidate access to the mod metadata stored into the database: a stored payload is always returned
+    immediately, and if it is stale it is refreshed in background. The remote site is scraped synchronously only for
+    mods never seen before.
+    """
+    stored = get_mod_metadata(sid, kind)
+    if not stored:
+        return _fetch_payload(kind, sid, fetch, schema)
+
+    payload, fetched_at = stored
+    if datetime.datetime.now() - fetched_at > METADATA_STALE_AFTER:
+        _revalidate(kind, sid, fetch, schema)
+
+    return payload
+
+
+def base_mod_payload(sid: str) -> dict:
+    """
+    Returns the ModBaseSchema dump of the mod
+    """
+    return _mod_payload(METADATA_KINDS.BASE, sid, base_mod, ModBaseSchema())
+
+
+def full_mod_payload(sid: str) -> dict:
+    """
+    Returns the FullModSchema dump of the mod
+    """
+    return _mod_payload(METADATA_KINDS.FULL, sid, full_mod, FullModSchema())
@@ -1,8 +1,11 @@
 import json
-from typing import Union
+import threading
+import time
+from typing import Union, Callable
 
 import websocket
 
+from db.app import get_configuration_int, CONFIGURATION_KEYS, DEFAULT_STATUS_PUBLISH_RATE
 from schema.app import ModStatusSchema
 from smods_manager.app import WEBSOCKET_PORT
 from smods_websocket.model import WebsocketMessage, ModStatus
@@ -15,12 +18,159 @@ def create_status_message(channel: str, payload: Union[dict, str]) -> WebsocketM
     return WebsocketMessage(type="status", channel=channel, payload=payload)
 
 
-def send_status(websock: websocket.WebSocket, channel: str, status: ModStatus):
-    logger.debug("Sending message to the WebSocket...")
-    logger.debug(f"Websocket status: status={websock.status}, timeout={websock.timeout}, connected={websock.connected}")
-    status_object = create_status_message(channel, ModStatusSchema().dump(status))
-    if websock.connected:
+def create_batch_message(channel: str, payload: dict) -> WebsocketMessage:
+    return WebsocketMessage(type="batch", channel=channel, payload=payload)
+
+
+def create_task_message(channel: str, payload: dict) -> WebsocketMessage:
+    return WebsocketMessage(type="task", channel=channel, payload=payload)
+
+
+class StatusPublisher(object):
+    """
+    Publishes the messages of the tasks to the websocket server through a single long-lived connection, shared by all
+    the threads of the process. The connection is opened on the first message and, if it drops, opened again on the
+    next one (at most once every RECONNECT_INTERVAL seconds: messages published meanwhile are dropped).
+    When the websocket server runs into the same process, a local sink can be set to skip the connection at all.
+
+    Progress messages are coalesced: only the latest one of each channel is kept, and it is built (from a factory)
+    and sent by a background thread at most rate times per second. A message published immediately supersedes the
+    pending progress of its channel.
+    """
+    RECONNECT_INTERVAL = 2
+
+    def __init__(self, url: str, rate: int = None):
+        self.url = url
+        self.rate = rate  # progress messages per second, for each channel
+
+        self._ws: websocket.WebSocket | None = None
+        self._lock = threading.Lock()  # held while sending, so messages are sent in the order they are published
+        self._last_connect = 0
+        self._local_sink: Callable[[str], None] | None = None
+
+        self._pending: dict[tuple[str, str], Callable[[], WebsocketMessage]] = {}
+        self._pending_lock = threading.Lock()
+        self._flusher: threading.Thread | None = None
+
+    def set_local_sink(self, sink: Callable[[str], None] | None):
+        self._local_sink = sink
+
+    def _connect(self) -> websocket.WebSocket | None:
+        if self._ws and self._ws.connected:
+            return self._ws
+
+        if time.monotonic() - self._last_connect < self.RECONNECT_INTERVAL:
+            return None
+        self._last_connect = time.monotonic()
+
+        try:
+            logger.info(f"Connecting to websocket {self.url}")
+            self._ws = websocket.create_connection(self.url)
+            # publishers don't need the messages sent to the clients: the server won't route any to this connection
+            self._ws.send(json.dumps(dict(WebsocketMessage(type="hello", channel="hello",
+                                                           payload={"role": "publisher"}))))
+        except Exception as e:
+            logger.warn(f"Cannot connect to websocket {self.url}: {e}")
+            self._ws = None
+            return None
+
+        threading.Thread(target=self._drain, args=(self._ws,), name="status-publisher-drain", daemon=True).start()
+        return self._ws
+
+    @staticmethod
+    def _drain(ws: websocket.WebSocket):
+        # frames sent by the server to this connection (e.g. its greeting) must be read and discarded, otherwise
+        # they would fill the socket buffers
         try:
-            websock.send(json.dumps(dict(status_object)))
+            while ws.connected:
+                ws.recv()
         except Exception:
-            websock.connect(f"ws://localhost:{WEBSOCKET_PORT}")
+            pass
+
+    def _send(self, message: WebsocketMessage):
+        data = json.dumps(dict(message))
+        if self._local_sink:
+            self._local_sink(data)
+            return
+
+        for _ in range(2):  # if the connection has dropped, we retry once with a new connection
+            ws = self._connect()
+            if not ws:
+                logger.debug(f"Websocket not connected: message on channel {message['channel']} dropped")
+                return
+            try:
+                ws.send(data)
+                return
+            except Exception as e:
+                logger.warn(f"Websocket connection lost: {e}")
+                ws.close()
+                self._ws = None
+                self._last_connect = 0
+
+    def publish(self, message: WebsocketMessage):
+        """
+        Sends the message immediately
+        """
+        with self._lock:
+            with self._pending_lock:
+                self._pending.pop((message["type"], message["channel"]), None)
+            self._send(message)
+
+    def publish_coalesced(self, message_type: str, channel: str, factory: Callable[[], WebsocketMessage]):
+        """
+        Schedules the message built by factory, replacing the one still pending for the same channel
+        """
+        with self._pending_lock:
+            self._pending[(message_type, channel)] = factory
+            if not self._flusher:
+                self._flusher = threading.Thread(target=self._flush_loop, name="status-publisher-flush", daemon=True)
+                self._flusher.start()
+
+    def flush(self):
+        with self._lock:
+            with self._pending_lock:
+                pending, self._pending = self._pending, {}
+
+            for factory in pending.values():
+                try:
+                    self._send(factory())
+                except Exception as e:
+                    logger.warn(f"Cannot publish a progress message: {e}")
+
+    def _flush_loop(self):
+        rate = self.rate or get_configuration_int(CONFIGURATION_KEYS.STATUS_PUBLISH_RATE, DEFAULT_STATUS_PUBLISH_RATE)
+        interval = 1 / max(rate, 1)
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def close(self):
+        with self._lock:
+            if self._ws:
+                self._ws.close()
+                self._ws = None
+
+
+status_publisher = StatusPublisher(f"ws://localhost:{WEBSOCKET_PORT}")
+
+
+def send_batch_status(channel: str, payload: dict):
+    status_publisher.publish(create_batch_message(channel, payload))
+
+
+def send_task_status(channel: str, payload: dict):
+    status_publisher.publish(create_task_message(channel, payload))
+
+
+def send_status(channel: str, status: ModStatus):
+    logger.debug(f"Sending message to the WebSocket on channel {channel}...")
+    status_publisher.publish(create_status_message(channel, ModStatusSchema().dump(status)))
+
+
+def send_status_progress(channel: str, status_factory: Callable[[], ModStatus]):
+    """
+    Coalesced version of send_status for the progress messages: the status is built by status_factory only when (and
+    if) it is sent, so frequent progress updates cost nothing until they are published
+    """
+    status_publisher.publish_coalesced(
+        "status", channel, lambda: create_status_message(channel, ModStatusSchema().dump(status_factory())))
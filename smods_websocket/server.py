@@ -1,10 +1,15 @@
 import asyncio
+import itertools
 import json
 import logging
+from collections import deque, OrderedDict
+from fnmatch import fnmatchcase
 from multiprocessing import Process
+from urllib.parse import urlsplit, parse_qs
 
 import websockets
 
+from smods_websocket.client import status_publisher
 from smods_websocket.model import WebsocketMessage
 from utils.logger import get_logger
 
@@ -27,6 +32,112 @@ class LoggerAdapter(logging.LoggerAdapter):
         return f"{websocket.id} {xff} {msg}", kwargs
 
 
+CLIENT_QUEUE_SIZE = 256  # messages queued for a client before the oldest ones are dropped
+LAST_VALUE_CACHE_SIZE = 1024  # channels whose latest snapshot message is kept, to be replayed to new subscribers
+
+# messages carrying the whole state of their channel: a queued message of these types is replaced by a newer one of the
+# same channel, since only the latest value matters
+SNAPSHOT_MESSAGE_TYPES = {"status", "batch", "task"}
+
+
+class ClientConnection(object):
+    """
+    A client of the websocket server, with its own bounded queue of messages and a task that sends them, so a slow
+    client doesn't delay the others. When the queue is full, the oldest message is dropped.
+    A client receives only the messages of the channels it has subscribed to (channel names or fnmatch patterns), or
+    all the messages if it has never subscribed. Publishers (the tasks) don't receive any message.
+    """
+    def __init__(self, websocket, maxsize: int = CLIENT_QUEUE_SIZE):
+        self.websocket = websocket
+        self.maxsize = maxsize
+
+        self.publisher = False
+        self.subscribed = False
+        self._channels: set[str] = set()
+        self._patterns: set[str] = set()
+
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0  # snapshot messages replaced by a newer one before being sent
+
+        self._order: deque = deque()  # keys of the queued messages, in send order
+        self._messages: dict = {}  # key -> message
+        self._counter = itertools.count()
+        self._ready = asyncio.Event()
+
+    @property
+    def depth(self) -> int:
+        return len(self._order)
+
+    @property
+    def subscriptions(self) -> list[str]:
+        return sorted(self._channels | self._patterns)
+
+    def subscribe(self, channels: list[str]):
+        self.subscribed = True
+        for channel in channels:
+            if any(c in channel for c in "*?["):
+                self._patterns.add(channel)
+            else:
+                self._channels.add(channel)
+
+    def unsubscribe(self, channels: list[str]):
+        for channel in channels:
+            self._channels.discard(channel)
+            self._patterns.discard(channel)
+
+    def wants(self, channel: str | None) -> bool:
+        if self.publisher:
+            return False
+        if not self.subscribed:
+            return True
+        if channel is None:
+            return False
+
+        return channel in self._channels or any(fnmatchcase(channel, pattern) for pattern in self._patterns)
+
+    def put(self, message: str, snapshot_key: tuple[str, str] = None):
+        if snapshot_key is not None and snapshot_key in self._messages:
+            # latest value wins: the message keeps the queue position of the replaced one
+            self._messages[snapshot_key] = message
+            self.coalesced += 1
+            return
+
+        if len(self._order) >= self.maxsize:
+            del self._messages[self._order.popleft()]
+            self.dropped += 1
+
+        key = snapshot_key if snapshot_key is not None else next(self._counter)
+        self._order.append(key)
+        self._messages[key] = message
+        self._ready.set()
+
+    def replay(self, messages: list[tuple[tuple[str, str], str]]):
+        """
+        Queues the snapshot messages of the last-value cache. The queue bound doesn't apply to them, since their number
+        is already bounded by the size of the cache
+        """
+        for snapshot_key, message in messages:
+            if snapshot_key not in self._messages:
+                self._order.append(snapshot_key)
+            self._messages[snapshot_key] = message
+        if messages:
+            self._ready.set()
+
+    async def run(self):
+        while True:
+            await self._ready.wait()
+            while self._order:
+                message = self._messages.pop(self._order.popleft())
+                await self.websocket.send(message)
+                self.sent += 1
+            self._ready.clear()
+
+    def metrics(self) -> dict:
+        return {"id": str(self.websocket.id), "publisher": self.publisher, "subscriptions": self.subscriptions,
+                "depth": self.depth, "sent": self.sent, "dropped": self.dropped, "coalesced": self.coalesced}
+
+
 class WsServer(Process):
     def __init__(self, address, port, stop_event):
         super().__init__()
@@ -36,33 +147,132 @@ class WsServer(Process):
         self.stop_event = stop_event
         self.loop = asyncio.get_event_loop()
 
-        self.connections = set()
+        self.connections: dict = {}  # websocket -> ClientConnection
+        # latest snapshot message of each channel, in least recently updated order
+        self.last_values: OrderedDict[tuple[str, str], str] = OrderedDict()
 
-    async def register(self, websocket):
-        self.connections.add(websocket)
+    async def register(self, websocket) -> ClientConnection:
+        client = ClientConnection(websocket)
+        self.connections[websocket] = client
+        return client
 
     async def unregister(self, websocket):
-        self.connections.remove(websocket)
+        self.connections.pop(websocket, None)
+
+    @staticmethod
+    def _parse(message: str) -> dict:
+        try:
+            parsed = json.loads(message)
+            return parsed if isinstance(parsed, dict) else {}
+        except ValueError:
+            return {}
+
+    async def notify(self, message: str, websocket, parsed: dict = None):
+        """
+        Queues the message for all the clients (but the sender) that want its channel. Clients send their queued
+        messages concurrently.
+        """
+        parsed = self._parse(message) if parsed is None else parsed
+        channel = parsed.get("channel")
+        snapshot_key = None
+        if parsed.get("type") in SNAPSHOT_MESSAGE_TYPES and channel is not None:
+            snapshot_key = parsed["type"], channel
+            self.last_values[snapshot_key] = message
+            self.last_values.move_to_end(snapshot_key)
+            if len(self.last_values) > LAST_VALUE_CACHE_SIZE:
+                self.last_values.popitem(last=False)
+
+        for connection, client in list(self.connections.items()):
+            if connection != websocket and client.wants(channel):
+                client.put(message, snapshot_key)
+
+    def replay_last_values(self, client: ClientConnection, channels: list[str]):
+        """
+        Sends to the client the latest snapshot message of the given channels (names or patterns)
+        """
+        client.replay([(key, message) for key, message in self.last_values.items()
+                       if any(fnmatchcase(key[1], channel) for channel in channels)])
+
+    @staticmethod
+    def _channels(parsed: dict) -> list[str]:
+        # {"channel": "..."} or {"channels": [...]}
+        channels = parsed.get("channels") or [parsed.get("channel")]
+        return [str(channel) for channel in channels if channel is not None]
+
+    @staticmethod
+    def _connect_channels(websocket) -> list[str]:
+        # channels declared into the connection url: ws://host:port/?channels=123456,batch-*
+        # websockets >= 13 exposes the handshake request, the legacy implementation only its path
+        request = getattr(websocket, "request", None)
+        path = request.path if request is not None else getattr(websocket, "path", "")
+        query = parse_qs(urlsplit(path or "").query)
+        return [channel for value in query.get("channels", []) + query.get("channel", [])
+                for channel in value.split(",") if channel]
+
+    def handle_control_message(self, client: ClientConnection, parsed: dict) -> bool:
+        """
+        Handles the messages sent by a client to the server itself. Returns False if the message must be broadcast
+        """
+        message_type = parsed.get("type")
+        if message_type == "metrics":
+            # metrics are requested by a client for itself, they are not broadcast
+            client.put(json.dumps(dict(WebsocketMessage(type="metrics", channel="metrics", payload=self.metrics()))))
+        elif message_type == "hello":
+            client.publisher = (parsed.get("payload") or {}).get("role") == "publisher"
+        elif message_type in ("subscribe", "unsubscribe"):
+            channels = self._channels(parsed)
+            if message_type == "subscribe":
+                client.subscribe(channels)
+            else:
+                client.unsubscribe(channels)
+            client.put(json.dumps(dict(WebsocketMessage(type="subscriptions", channel="subscriptions",
+                                                        payload=client.subscriptions))))
+            if message_type == "subscribe" and not client.publisher:
+                # the current state of the new channels, so the client doesn't have to wait for their next message
+                self.replay_last_values(client, channels)
+        else:
+            return False
+
+        return True
 
-    async def notify(self, message: WebsocketMessage, websocket):
-        connection_list = []
-        for connection in self.connections:
-            if connection != websocket:
-                connection_list.append(connection)
+    def metrics(self) -> dict:
+        clients = [client.metrics() for client in self.connections.values()]
+        return {
+            "clients": clients,
+            "queued": sum(client["depth"] for client in clients),
+            "max_depth": max((client["depth"] for client in clients), default=0),
+            "dropped": sum(client["dropped"] for client in clients),
+            "coalesced": sum(client["coalesced"] for client in clients),
+            "last_values": len(self.last_values)
+        }
 
-        for connection in connection_list:
-            await connection.send(message)
+    def publish(self, message: str):
+        """
+        Broadcasts a message from another thread of this process, without passing through a websocket connection
+        """
+        asyncio.run_coroutine_threadsafe(self.notify(message, None), self.loop)
 
     async def handle_connection(self, websocket):
         logger.debug("New connection!")
-        await self.register(websocket)
+        client = await self.register(websocket)
+        sender = None
         try:
             await websocket.send(json.dumps({"status": "Connected"}))
+            channels = self._connect_channels(websocket)
+            if channels:
+                # the client subscribes on connect: it gets the current state of its channels right away
+                client.subscribe(channels)
+                self.replay_last_values(client, channels)
+            sender = asyncio.create_task(client.run())
             async for message in websocket:
                 logger.debug(message)
-                await self.notify(message, websocket)
+                parsed = self._parse(message)
+                if not self.handle_control_message(client, parsed):
+                    await self.notify(message, websocket, parsed)
         finally:
             await self.unregister(websocket)
+            if sender:
+                sender.cancel()
 
     # async def start_server(self, stop):
     #     async with websockets.serve(self.handle_connection, self.address, self.port,
@@ -71,6 +281,8 @@ class WsServer(Process):
 
     def run(self) -> None:
         logger.info(f"Starting websocket on port {self.port}")
+        # tasks running into this process publish their messages directly to the server
+        status_publisher.set_local_sink(self.publish)
         # stop = self.loop.run_in_executor(None, self.stop_event.wait)
         # self.loop.run_until_complete(self.start_server(stop))
         ws_server = websockets.serve(self.handle_connection, self.address, self.port,
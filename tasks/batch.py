@@ -0,0 +1,128 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+
+from db.app import get_configuration_int, CONFIGURATION_KEYS, DEFAULT_BATCH_WORKERS
+from db.mods import get_installed_mods, add_dependencies
+from smods_websocket.client import send_batch_status
+from tasks.dependencies import resolve_dependencies
+from tasks.mod_operation_utils import create_status_object, ModOperationError
+from tasks.mods import install_mod
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def batch_channel(batch_id: str) -> str:
+    return f"batch-{batch_id}"
+
+
+def install_batch(batch_id: str, mods: list[tuple[str, str | None]]):
+    """
+    Installs a list of (mod_id, revision_id) with all their dependencies. If revision_id is None, the latest revision
+    is installed. The dependency graph of the whole list is resolved once, so dependencies shared by several mods are
+    installed only once, then all the mods are installed by a bounded pool of workers. Each mod is installed only after
+    all its dependencies: if a mod fails, the mods that depend on it fail without being installed.
+    The aggregated progress is sent on the websocket channel batch-{batch_id}, while each mod still sends its own
+    status on its channel.
+    """
+    logger.info(f"Batch {batch_id}: installing {len(mods)} mods")
+    progress = {"op": "batch_install", "state": "get_dependencies", "batch_id": batch_id, "total": 0,
+                "completed": [], "failed": [], "skipped": []}
+    progress_lock = threading.Lock()
+    ws_send_batch_status = partial(send_batch_status, batch_channel(batch_id))
+
+    try:
+        ws_send_batch_status(progress)
+
+        requested_revisions = dict(mods)
+        dependency_graph = resolve_dependencies(list(requested_revisions.keys()))
+        installed_mods = {im.id for im in get_installed_mods()}
+
+        to_install = []
+        for m in dependency_graph.install_order(include_roots=True):
+            if m.id in installed_mods:
+                progress["skipped"].append(m.id)  # TODO: check for updates?
+            else:
+                to_install.append((m, requested_revisions.get(m.id) or m.latest_revision.id))
+
+        progress["state"] = "installing"
+        progress["total"] = len(to_install)
+        ws_send_batch_status(progress)
+
+        # each mod waits for its dependencies that come before it into the install order (the ones after it close a
+        # cycle, and are ignored like in the single mod installation)
+        position = {m.id: i for i, (m, revision_id) in enumerate(to_install)}
+        revisions = {m.id: (m, revision_id) for m, revision_id in to_install}
+        waiting = {m.id: {d for d in dependency_graph.edges.get(m.id, []) if position.get(d, len(to_install)) < i}
+                   for i, (m, revision_id) in enumerate(to_install)}
+
+        def install(m, revision_id) -> bool:
+            try:
+                # if another task is already installing the mod, we wait for it and check its result
+                install_mod(m, revision_id, install_deps=False, join_busy=True)
+                status = create_status_object(m.id)
+                succeeded = bool(status.installed) and not status.installing
+            except ModOperationError as e:
+                logger.warn(f"Batch {batch_id}: installation of mod {m.id} failed: {e.code} - {e.message}")
+                succeeded = False
+            except Exception as e:
+                logger.error(f"Batch {batch_id}: installation of mod {m.id} failed", exc_info=e)
+                succeeded = False
+
+            if succeeded:
+                # the mod has been installed without its dependencies, so we save them now
+                add_dependencies({m.id: dependency_graph.edges.get(m.id, [])})
+
+            with progress_lock:
+                progress["completed" if succeeded else "failed"].append(m.id)
+                ws_send_batch_status(progress)
+
+            return succeeded
+
+        def fail_dependents(mod_id):
+            # the mods that depend (also indirectly) on a failed mod are not installed, and they fail too
+            failed = [mod_id]
+            while failed:
+                failed_id = failed.pop()
+                for dependent_id in [d for d, dependency_ids in waiting.items() if failed_id in dependency_ids]:
+                    logger.warn(f"Batch {batch_id}: dependency {failed_id} failed, mod {dependent_id} not installed")
+                    del waiting[dependent_id]
+                    failed.append(dependent_id)
+                    with progress_lock:
+                        progress["failed"].append(dependent_id)
+                        ws_send_batch_status(progress)
+
+        workers = get_configuration_int(CONFIGURATION_KEYS.BATCH_WORKERS, DEFAULT_BATCH_WORKERS)
+        with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="install_batch") as executor:
+            running = {}  # future -> mod id
+
+            def submit_ready():
+                for mod_id in [mod_id for mod_id, dependency_ids in waiting.items() if not dependency_ids]:
+                    del waiting[mod_id]
+                    running[executor.submit(install, *revisions[mod_id])] = mod_id
+
+            # a mod is scheduled only after all its dependencies have been installed
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    mod_id = running.pop(future)
+                    if future.result():
+                        for dependency_ids in waiting.values():
+                            dependency_ids.discard(mod_id)
+                    else:
+                        fail_dependents(mod_id)
+                submit_ready()
+
+        progress["state"] = "done"
+        ws_send_batch_status(progress)
+        logger.info(f"Batch {batch_id} completed: {len(progress['completed'])} installed, "
+                    f"{len(progress['failed'])} failed, {len(progress['skipped'])} skipped")
+    except Exception as e:
+        logger.error(f"Batch {batch_id}: an error have occurred", exc_info=e)
+        progress["state"] = "error"
+        progress["code"] = "exception"
+        progress["message"] = str(e)
+        ws_send_batch_status(progress)
+        raise
@@ -0,0 +1,113 @@
+from smodslib.model import ModBase
+
+from db.mods import get_known_dependencies
+from smods_manager.remote import base_mod, full_mod
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ModDependency(object):
+    """
+    A mod of the dependency graph, with the list of the mods that require it. Other attributes are read from the
+    wrapped ModBase object, so it can be dumped with the ModDependencySchema.
+    """
+    def __init__(self, mod: ModBase, required_by: list[ModBase]):
+        self.mod = mod
+        self.required_by = required_by
+
+    def __getattr__(self, item):
+        return getattr(self.mod, item)
+
+
+class DependencyGraph(object):
+    def __init__(self, roots: list[str], mods: dict[str, ModBase], edges: dict[str, list[str]], order: list[str],
+                 cycles: list[list[str]]):
+        self.roots = roots
+        self.mods = mods
+        self.edges = edges  # mod id -> ids of the mods it requires
+        self.order = order  # topological order: each mod comes after all its dependencies
+        self.cycles = cycles  # each cycle is the list of mod ids that form it
+
+    def install_order(self, include_roots=False) -> list[ModBase]:
+        return [self.mods[mod_id] for mod_id in self.order if include_roots or mod_id not in self.roots]
+
+    def dependencies(self) -> list[ModDependency]:
+        """
+        Returns all the dependencies of the roots (roots excluded), in install order
+        """
+        required_by: dict[str, list[ModBase]] = {}
+        for mod_id, dependency_ids in self.edges.items():
+            for dependency_id in dependency_ids:
+                required_by.setdefault(dependency_id, []).append(self.mods[mod_id])
+
+        return [ModDependency(self.mods[mod_id], required_by[mod_id]) for mod_id in self.order
+                if mod_id in required_by and mod_id not in self.roots]
+
+
+class DependencyResolver(object):
+    """
+    Builds the dependency graph of a set of mods. Edges are memoized, so a resolver should be created for each request
+    and each mod is visited only once. Dependencies of installed mods are read from the local ModDependencies table,
+    the others from the (cached) remote mod pages.
+    """
+    def __init__(self):
+        self._mods: dict[str, ModBase] = {}
+        self._edges: dict[str, list[str]] = {}
+
+    def mod(self, mod_id: str) -> ModBase:
+        if mod_id not in self._mods:
+            self._mods[mod_id] = base_mod(mod_id)
+
+        return self._mods[mod_id]
+
+    def edges(self, mod_id: str) -> list[str]:
+        if mod_id in self._edges:
+            return self._edges[mod_id]
+
+        dependency_ids = get_known_dependencies(mod_id)
+        if dependency_ids is None:
+            if self.mod(mod_id).has_dependencies:
+                requirements = full_mod(mod_id).mod_requirements or []
+                dependency_ids = [requirement.id for requirement in requirements]
+            else:
+                dependency_ids = []
+
+        self._edges[mod_id] = dependency_ids
+        return dependency_ids
+
+    def resolve(self, roots: str | list[str]) -> DependencyGraph:
+        roots = [roots] if isinstance(roots, str) else list(roots)
+
+        order: list[str] = []
+        cycles: list[list[str]] = []
+        visited: set[str] = set()
+        path: list[str] = []  # mods currently being visited, used to detect cycles
+
+        def visit(mod_id: str):
+            if mod_id in path:
+                cycle = path[path.index(mod_id):] + [mod_id]
+                logger.warn(f"Dependency cycle found: {' -> '.join(cycle)}")
+                cycles.append(cycle)
+                return
+            if mod_id in visited:
+                return
+
+            path.append(mod_id)
+            self.mod(mod_id)
+            for dependency_id in self.edges(mod_id):
+                visit(dependency_id)
+            path.pop()
+
+            visited.add(mod_id)
+            order.append(mod_id)
+
+        for root in roots:
+            visit(root)
+
+        return DependencyGraph(roots, {mod_id: self._mods[mod_id] for mod_id in order},
+                               {mod_id: self._edges[mod_id] for mod_id in order}, order, cycles)
+
+
+def resolve_dependencies(mods: str | list[str]) -> DependencyGraph:
+    return DependencyResolver().resolve(mods)
@@ -0,0 +1,175 @@
+import datetime
+import os
+import shutil
+import threading
+from pathlib import Path
+from zipfile import is_zipfile
+
+from sqlalchemy.orm import Session
+
+from db import engine
+from db.app import get_configuration_int, CONFIGURATION_KEYS, DEFAULT_DOWNLOAD_CACHE_SIZE
+from db.model import DownloadedRevisions, InstalledRevisions, InstallJob
+from smods_manager.app import download_store_folder
+from tasks.status_index import status_index
+from utils.logger import get_logger
+from utils.utils import file_sha256
+
+logger = get_logger(__name__)
+
+_eviction_lock = threading.Lock()
+
+
+def store_path(sha256: str) -> str:
+    return os.path.join(download_store_folder, sha256[:2], f"{sha256}.zip")
+
+
+def store_archive(path: str) -> tuple[str, str, int]:
+    """
+    Moves the archive at path into the content-addressed download store. If the store already contains an archive
+    with the same content (e.g. the same zip downloaded for another revision), the archive at path is removed and the
+    stored one is reused. A stored archive whose content doesn't match its name (e.g. truncated or corrupted) is
+    replaced by the archive at path.
+    Returns the path of the stored archive, its sha256 and its size.
+    """
+    sha256 = file_sha256(path)
+    size = os.path.getsize(path)
+    stored = store_path(sha256)
+
+    if os.path.abspath(path) == os.path.abspath(stored):
+        return stored, sha256, size
+
+    if verify_archive(stored, sha256, size):
+        logger.info(f"Archive {path} already stored at {stored}")
+        os.remove(path)
+        return stored, sha256, size
+
+    if os.path.isfile(stored):
+        logger.warn(f"Stored archive {stored} is corrupted: replacing it with {path}")
+        os.remove(stored)
+
+    Path(stored).parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(path, stored)
+
+    return stored, sha256, size
+
+
+def verify_archive(path: str, sha256: str | None, size: int | None) -> bool:
+    """
+    Checks that the archive at path still exists and that its content is the one recorded when it has been stored.
+    Archives without a recorded hash (downloaded before the download store) are only checked to be valid zip files.
+    """
+    if not path or not os.path.isfile(path):
+        return False
+
+    if sha256 is None:
+        return is_zipfile(path)
+
+    if size is not None and os.path.getsize(path) != size:
+        return False
+
+    return file_sha256(path) == sha256
+
+
+class StoredArchive(object):
+    def __init__(self, path: str, size: int, last_access: datetime.datetime):
+        self.path = path
+        self.size = size
+        self.last_access = last_access
+        self.entries: list[DownloadedRevisions] = []  # DownloadedRevisions entries sharing this archive
+        self.protected = False  # archive of an installed revision, or used by a running installation
+
+
+def _stored_archives(sess: Session) -> list[StoredArchive]:
+    """
+    Returns the archives of the DownloadedRevisions entries and the archives into the store not referenced by any
+    entry (e.g. left by an installation interrupted before saving it)
+    """
+    installed = {(ir.mod_id, ir.revision_id) for ir in sess.query(InstalledRevisions)}
+    in_use = {os.path.abspath(job.zip_path) for job in sess.query(InstallJob) if job.zip_path}
+
+    archives: dict[str, StoredArchive] = {}
+    for dr in sess.query(DownloadedRevisions):
+        path = os.path.abspath(dr.path)
+        if not os.path.isfile(path):
+            continue
+
+        archive = archives.get(path)
+        if not archive:
+            archive = archives[path] = StoredArchive(path, os.path.getsize(path), datetime.datetime.min)
+        archive.entries.append(dr)
+        archive.last_access = max(archive.last_access, dr.last_access or datetime.datetime.min)
+        archive.protected |= (dr.mod_id, dr.revision_id) in installed
+
+    for root, dirs, files in os.walk(download_store_folder):
+        for f in files:
+            path = os.path.abspath(os.path.join(root, f))
+            if path not in archives:
+                archives[path] = StoredArchive(path, os.path.getsize(path),
+                                               datetime.datetime.fromtimestamp(os.path.getmtime(path)))
+
+    for path in in_use:
+        if path in archives:
+            archives[path].protected = True
+
+    return list(archives.values())
+
+
+def _max_cache_size() -> int:
+    return get_configuration_int(CONFIGURATION_KEYS.DOWNLOAD_CACHE_SIZE, DEFAULT_DOWNLOAD_CACHE_SIZE) * 1024 * 1024
+
+
+def download_cache_usage() -> dict:
+    with Session(engine) as sess:
+        archives = _stored_archives(sess)
+
+    return {
+        "size": sum(archive.size for archive in archives),
+        "max_size": _max_cache_size(),
+        "archives": len(archives),
+        "protected_size": sum(archive.size for archive in archives if archive.protected)
+    }
+
+
+def evict_archives(max_size: int = None) -> int:
+    """
+    Removes the least recently used archives (with their DownloadedRevisions entries) until the size of the downloaded
+    archives fits max_size bytes (by default, the download.cache.size configuration). Archives of installed
+    revisions, or used by a running installation, are never removed. Returns the number of bytes freed.
+    """
+    max_size = _max_cache_size() if max_size is None else max_size
+    if max_size <= 0:
+        return 0
+
+    freed = 0
+    evicted_mods = set()
+    with _eviction_lock, Session(engine) as sess:
+        archives = _stored_archives(sess)
+        size = sum(archive.size for archive in archives)
+        if size <= max_size:
+            return 0
+
+        for archive in sorted((a for a in archives if not a.protected), key=lambda a: a.last_access):
+            if size - freed <= max_size:
+                break
+
+            logger.info(f"Evicting archive {archive.path} ({archive.size} bytes)")
+            try:
+                os.remove(archive.path)
+            except OSError as e:
+                logger.warn(f"Cannot remove archive {archive.path}: {e}")
+                continue
+
+            freed += archive.size
+            for dr in archive.entries:
+                evicted_mods.add(dr.mod_id)
+                sess.delete(dr)
+
+        sess.commit()
+
+    if size - freed > max_size:
+        logger.warn(f"Download cache size ({size - freed} bytes) still over the limit ({max_size} bytes): the other "
+                    f"archives are in use")
+    if evicted_mods:
+        status_index.refresh(*evicted_mods)
+    return freed
@@ -0,0 +1,126 @@
+import os
+import shutil
+import time
+
+from sqlalchemy.orm import Session
+
+from db import engine
+from db.jobs import JOB_STEPS, start_install_job, update_install_job, finish_install_job, get_install_jobs
+from db.model import InstallJob, InstalledRevisions, DownloadedRevisions
+from tasks.download_store import store_archive
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+JOURNAL_PROGRESS_INTERVAL = 2  # seconds between two writes of the progress of a step
+MAX_RESUME_ATTEMPTS = 3  # an installation interrupted more times than this is rolled back
+
+
+class JobJournal(object):
+    """
+    Journals the steps of an installation into the InstallJob table, so an installation interrupted by a crash can be
+    recovered at the next startup (see recover_install_jobs).
+    """
+    def __init__(self, mod_id: str, revision_id: str, install_deps: bool):
+        self.mod_id = mod_id
+        self._last_progress = 0
+        start_install_job(mod_id, revision_id, install_deps)
+
+    def step(self, step: str, **fields):
+        update_install_job(self.mod_id, step=step, done_bytes=0, total_bytes=0, **fields)
+        self._last_progress = time.monotonic()
+
+    def update(self, **fields):
+        update_install_job(self.mod_id, **fields)
+
+    def progress(self, done: int, total: int):
+        """
+        Journals the progress of the current step, at most once every JOURNAL_PROGRESS_INTERVAL seconds
+        """
+        now = time.monotonic()
+        if now - self._last_progress < JOURNAL_PROGRESS_INTERVAL and done < total:
+            return
+
+        self._last_progress = now
+        update_install_job(self.mod_id, done_bytes=done, total_bytes=total)
+
+    def finish(self):
+        finish_install_job(self.mod_id)
+
+
+def _remove_path(path: str | None):
+    if path and os.path.isdir(path):
+        logger.info(f"Recovery: removing folder {path}")
+        shutil.rmtree(path, ignore_errors=True)
+    elif path and os.path.exists(path):
+        logger.info(f"Recovery: removing file {path}")
+        os.remove(path)
+
+
+def recover_install_jobs():
+    """
+    Recovers the installations interrupted by a crash (or a kill) of the app. It must be executed at startup, before
+    any task can run.
+    Partially unzipped and copied files are removed, as well as the "installing" InstalledRevisions entries. If the
+    archive of the revision had been completely downloaded, it is registered as downloaded and the job is marked as
+    interrupted, to be resumed by resume_install_jobs without downloading the archive again. The same happens if the
+    archive was being downloaded, and the download will continue from the partially downloaded file.
+    Otherwise, or if the installation has already been resumed MAX_RESUME_ATTEMPTS times, it is rolled back.
+    """
+    with Session(engine) as sess:
+        jobs = sess.query(InstallJob).all()
+        for job in jobs:
+            logger.info(f"Recovery: installation of revision {job.revision_id} of mod {job.mod_id} interrupted at "
+                        f"step {job.step} ({job.done_bytes}/{job.total_bytes} bytes)")
+            # during the download step, work_path is the partially downloaded file
+            partial = job.step == JOB_STEPS.DOWNLOAD and job.work_path and os.path.exists(job.work_path)
+            if not partial:
+                _remove_path(job.work_path)
+            _remove_path(job.created_path)
+
+            downloaded = job.zip_path and os.path.exists(job.zip_path)
+            if downloaded and not sess.get(DownloadedRevisions, (job.mod_id, job.revision_id)):
+                logger.info(f"Recovery: registering downloaded archive {job.zip_path}")
+                downloaded_revision = DownloadedRevisions(*store_archive(job.zip_path))
+                downloaded_revision.mod_id = job.mod_id
+                downloaded_revision.revision_id = job.revision_id
+                sess.add(downloaded_revision)
+
+            if (downloaded or partial) and job.attempts < MAX_RESUME_ATTEMPTS:
+                logger.info(f"Recovery: installation of mod {job.mod_id} will be resumed")
+                job.step = JOB_STEPS.INTERRUPTED
+                job.work_path = None
+                job.created_path = None
+                job.attempts += 1
+            else:
+                logger.info(f"Recovery: rolling back installation of mod {job.mod_id}")
+                if partial:
+                    _remove_path(job.work_path)
+                sess.delete(job)
+
+        # installations never journaled (or whose job has been lost) can't be resumed
+        installing = sess.query(InstalledRevisions).filter_by(status="installing").all()
+        for installed_revision in installing:
+            logger.info(f"Recovery: removing the installing revision {installed_revision.revision_id} of mod "
+                        f"{installed_revision.mod_id}")
+            sess.delete(installed_revision)
+
+        sess.commit()
+
+    return len(jobs)
+
+
+def resume_install_jobs():
+    """
+    Submits again the installations marked as interrupted by recover_install_jobs
+    """
+    from tasks.manager import task_manager, TaskConflictError
+    from tasks.mods import install_mod
+
+    for job in get_install_jobs(step=JOB_STEPS.INTERRUPTED):
+        logger.info(f"Resuming installation of revision {job.revision_id} of mod {job.mod_id}")
+        try:
+            task_manager.submit("install", install_mod, job.mod_id, job.revision_id, job.install_deps,
+                                mod_id=job.mod_id)
+        except TaskConflictError:
+            pass
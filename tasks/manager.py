@@ -0,0 +1,199 @@
+import datetime
+import itertools
+import threading
+import uuid
+from collections import OrderedDict
+from queue import PriorityQueue
+from typing import Callable
+
+from db.app import get_configuration_int, CONFIGURATION_KEYS, DEFAULT_TASK_WORKERS
+from smods_websocket.client import send_task_status
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAX_FINISHED_TASKS = 200  # finished tasks kept to be queried
+
+
+def task_channel(task_id: str) -> str:
+    return f"task-{task_id}"
+
+
+class TASK_STATES(object):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class TASK_PRIORITIES(object):
+    # lower values are executed first
+    HIGH = 0
+    NORMAL = 10
+    LOW = 20
+
+
+class TaskConflictError(Exception):
+    def __init__(self, mod_id: str, task_id: str):
+        super().__init__(f"Another task ({task_id}) is already queued or running for mod {mod_id}")
+        self.mod_id = mod_id
+        self.task_id = task_id
+
+
+class TaskError(Exception):
+    """
+    Raised by a task that stops with a handled error: the task fails with the error code and message
+    """
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class Task(object):
+    def __init__(self, kind: str, fn: Callable, args: tuple, mod_id: str = None,
+                 priority: int = TASK_PRIORITIES.NORMAL):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.fn = fn
+        self.args = args
+        self.mod_id = mod_id
+        self.priority = priority
+
+        self.state = TASK_STATES.QUEUED
+        self.error = None
+        self.error_code = None
+        self.created_at = datetime.datetime.now()
+        self.started_at = None
+        self.ended_at = None
+
+    @property
+    def active(self) -> bool:
+        return self.state in (TASK_STATES.QUEUED, TASK_STATES.RUNNING)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "mod_id": self.mod_id,
+            "priority": self.priority,
+            "state": self.state,
+            "error": self.error,
+            "error_code": self.error_code,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "ended_at": self.ended_at.isoformat() if self.ended_at else None
+        }
+
+
+class TaskManager(object):
+    """
+    Executes the tasks with a fixed size pool of workers, taking them from a priority queue. Only one task at a time
+    can be queued or running for a given mod.
+    Each change of the state of a task is sent on the websocket channel task-{task_id}.
+    """
+    def __init__(self, workers: int = None):
+        self.workers = workers
+
+        self._queue: PriorityQueue[tuple[int, int, Task]] = PriorityQueue()
+        self._counter = itertools.count()  # keeps FIFO order between tasks with the same priority
+        self._tasks: OrderedDict[str, Task] = OrderedDict()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _start(self):
+        if self._started:
+            return
+
+        workers = self.workers or get_configuration_int(CONFIGURATION_KEYS.TASK_WORKERS, DEFAULT_TASK_WORKERS)
+        for i in range(max(workers, 1)):
+            threading.Thread(target=self._work, name=f"task-worker-{i}", daemon=True).start()
+        self._started = True
+        logger.info(f"Task manager started with {workers} workers")
+
+    def submit(self, kind: str, fn: Callable, *args, mod_id: str = None,
+               priority: int = TASK_PRIORITIES.NORMAL) -> Task:
+        task = Task(kind, fn, args, mod_id=mod_id, priority=priority)
+        with self._lock:
+            self._start()
+            if mod_id:
+                for other in self._tasks.values():
+                    if other.mod_id == mod_id and other.active:
+                        raise TaskConflictError(mod_id, other.id)
+
+            self._tasks[task.id] = task
+            self._queue.put((priority, next(self._counter), task))
+            self._notify(task)
+
+        logger.info(f"Task {task.id} ({kind}) queued")
+        return task
+
+    def get(self, task_id: str) -> Task | None:
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def list(self) -> list[Task]:
+        with self._lock:
+            return list(self._tasks.values())
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        Cancels a queued task. Returns False if the task is not queued anymore.
+        """
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if not task or task.state != TASK_STATES.QUEUED:
+                return False
+
+            task.state = TASK_STATES.CANCELLED
+            task.ended_at = datetime.datetime.now()
+            self._forget_finished()
+            self._notify(task)
+
+        logger.info(f"Task {task_id} cancelled")
+        return True
+
+    @staticmethod
+    def _notify(task: Task):
+        # called holding the lock, so the messages of a task are sent in the order of its states
+        send_task_status(task_channel(task.id), task.to_dict())
+
+    def _forget_finished(self):
+        finished = [task_id for task_id, task in self._tasks.items() if not task.active]
+        for task_id in finished[:max(len(finished) - MAX_FINISHED_TASKS, 0)]:
+            del self._tasks[task_id]
+
+    def _work(self):
+        while True:
+            _, _, task = self._queue.get()
+            with self._lock:
+                if task.state != TASK_STATES.QUEUED:
+                    continue  # cancelled
+                task.state = TASK_STATES.RUNNING
+                task.started_at = datetime.datetime.now()
+                self._notify(task)
+
+            logger.info(f"Task {task.id} ({task.kind}) started")
+            try:
+                task.fn(*task.args)
+                state = TASK_STATES.DONE
+            except TaskError as e:
+                logger.warn(f"Task {task.id} ({task.kind}) failed: {e.code} - {e.message}")
+                task.error_code = e.code
+                task.error = e.message
+                state = TASK_STATES.FAILED
+            except Exception as e:
+                logger.error(f"Task {task.id} ({task.kind}) failed", exc_info=e)
+                task.error_code = "exception"
+                task.error = str(e)
+                state = TASK_STATES.FAILED
+
+            with self._lock:
+                task.state = state
+                task.ended_at = datetime.datetime.now()
+                self._forget_finished()
+                self._notify(task)
+
+
+task_manager = TaskManager()
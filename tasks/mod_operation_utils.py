@@ -1,43 +1,40 @@
+import functools
+import threading
+
 from smodslib.model import ModBase, ModRevision
-from sqlalchemy.orm import Session
 
-from db import engine
-from db.model import Mod
 from schema.mods import ModBaseSchema, ModRevisionSchema
+from smods_websocket.client import send_status
 from smods_websocket.model import ModStatus
+from tasks.manager import TaskError
+from tasks.status_index import status_index
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_locked_mods: set[str] = set()
+_locked_mods_lock = threading.Lock()
+_locked_mods_released = threading.Condition(_locked_mods_lock)
+
+
+class ModOperationError(TaskError):
+    """
+    Raised by a mod operation that stops with an error, after notifying it with an "error" operation
+    """
+    @classmethod
+    def from_operation(cls, operation: dict) -> "ModOperationError":
+        return cls(operation.get("code", "exception"), operation.get("message", ""))
 
 
 def create_status_object(mod_id: str) -> ModStatus:
-    installed = None
-    installing = False
-    downloaded = None
-    starred = False
-    playlists = []
-
-    with Session(engine) as db:
-        db_mod = db.query(Mod).filter_by(id=mod_id).first()
-        if db_mod:
-            # installed / installing
-            if db_mod.installed_revision_association:
-                installed = db_mod.installed_revision_association.revision
-                if db_mod.installed_revision_association.status.lower() == "installing":
-                    installing = True
-
-            # downloaded
-            if db_mod.downloaded_revisions_association:
-                downloaded = []
-                for dr in db_mod.downloaded_revisions_association:
-                    downloaded.append(dr.revision)
-
-            # starred / playlists
-            for pa in db_mod.playlists_association:
-                if pa.playlist.id == 0:  # playlist 0 is starred mods
-                    starred = True
-                else:
-                    playlists.append(pa.playlist)
-
-    return ModStatus(installed=installed, downloaded=downloaded, starred=starred, playlists=playlists,
-                     installing=installing)
+    return status_index.get(mod_id)
+
+
+def create_status_objects(mod_ids: list[str]) -> dict[str, ModStatus]:
+    """
+    Bulk version of create_status_object: returns a dict mod_id -> ModStatus
+    """
+    return status_index.get_many(mod_ids)
 
 
 def op_state(operation: str, state: str, mod: ModBase | None = None,
@@ -55,3 +52,44 @@ def op_state(operation: str, state: str, mod: ModBase | None = None,
         # base["revision"] = revision
 
     return base if not data else base | data
+
+
+def mod_operation(operation: str):
+    """
+    Decorator for the tasks that operate on a mod (the first argument, a ModBase or a mod id). Only one operation at a
+    time can run on a mod: if another one is running, the decorated task is not executed and a "mod_busy" error is
+    notified and raised.
+    If the decorated task is called with join_busy=True (e.g. to install a dependency), it waits for the end of the
+    running operation instead, and then returns without being executed: the caller can check the resulting mod status.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(mod_or_id, *args, join_busy: bool = False, **kwargs):
+            mod_id = mod_or_id.id if isinstance(mod_or_id, ModBase) else mod_or_id
+            with _locked_mods_lock:
+                busy = mod_id in _locked_mods
+                if busy and join_busy:
+                    logger.info(f"Another operation is running on mod {mod_id}: waiting for its end")
+                    _locked_mods_released.wait_for(lambda: mod_id not in _locked_mods)
+                    return
+                _locked_mods.add(mod_id)
+
+            if busy:
+                logger.warn(f"Another operation is running on mod {mod_id}: {operation} aborted")
+                status_object = create_status_object(mod_id)
+                status_object.operation = op_state(operation, "error", data={
+                    "code": "mod_busy",
+                    "message": f"Another operation is running on mod {mod_id}"})
+                send_status(mod_id, status_object)
+                raise ModOperationError.from_operation(status_object.operation)
+
+            try:
+                return fn(mod_or_id, *args, **kwargs)
+            finally:
+                with _locked_mods_lock:
+                    _locked_mods.discard(mod_id)
+                    _locked_mods_released.notify_all()
+
+        return wrapper
+
+    return decorator
@@ -1,49 +1,68 @@
+import copy
+import datetime
 import os
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from tempfile import mkdtemp
 from typing import Union
 
-import websocket
-from smodslib import generate_dependency_tree, generate_download_url, base_mod
-from smodslib.download import download_revision
+from smodslib import generate_download_url
 from smodslib.model import ModBase
-from smodslib.smods import get_mod_revisions
 from sqlalchemy.orm import Session
 
 from smods_manager.app import download_folder, get_asset_target_folder
+from smods_manager.remote import base_mod, get_mod_revisions
 from db import engine, SSession
-from db.app import get_configuration, CONFIGURATION_KEYS
+from db.app import get_configuration, get_configuration_int, CONFIGURATION_KEYS, DEFAULT_COPY_WORKERS, \
+    DEFAULT_DEPENDENCY_WORKERS, INSTALL_MODES
 from db.model import ModRevision, DownloadedRevisions, Mod
 from db.mods import create_mod_if_not_exists, create_revision_if_not_exists, get_installed_mods
-from tasks.mod_operation_utils import create_status_object, op_state
-from utils.utils import wait_for_file, unzip, copydir
-from smods_websocket.client import send_status
+from db.jobs import JOB_STEPS
+from tasks.dependencies import resolve_dependencies
+from tasks.download_store import store_archive, verify_archive, evict_archives
+from tasks.journal import JobJournal
+from tasks.mod_operation_utils import create_status_object, create_status_objects, op_state, mod_operation, \
+    ModOperationError
+from tasks.status_index import status_index
+from tasks.pipeline import get_install_pipeline
+from utils.download import download_file, part_path, TRANSIENT_HTTP_CODES, NETWORK_ERROR, DOWNLOAD_RETRIES, \
+    DOWNLOAD_BACKOFF, DOWNLOAD_MAX_BACKOFF
+from utils.utils import wait_for_file, unzip, unzip_staged, move_staged, copydir, create_staging_folder
+from smods_websocket.client import send_status, send_status_progress
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
-def install_mod(mod_or_id: Union[str, ModBase], revision_id: str, install_deps=False,
-                ws: websocket.WebSocket = None, child=False):  # if we already have a websocket, why don't reuse it?
+@mod_operation("install")
+def install_mod(mod_or_id: Union[str, ModBase], revision_id: str, install_deps=False, child=False):
     mod_id = mod_or_id.id if isinstance(mod_or_id, ModBase) else mod_or_id
     to_install_mod = mod_or_id if isinstance(mod_or_id, ModBase) else None
 
     logger.info(f"Installing revision {revision_id} of mod {mod_id}")
     db = SSession()
 
-    tmpdir = mkdtemp(prefix="smods_manager-")
+    tmpdir = None
+    created_folder = None  # folder created into the target folder by this installation, removed in case of rollback
     status_object = create_status_object(mod_id)
     status_object.installing = True
 
     install_op_object = partial(op_state, "install")
     rollback_fn = None  # checks when we can do rollback
+    journal = None
 
-    if not ws:
-        logger.info("Connecting to websocket")
-        ws = websocket.create_connection("ws://localhost:5001")
+    ws_send_status = partial(send_status, mod_id)
 
-    ws_send_status = partial(send_status, ws, mod_id)
+    def ws_send_progress(state: str, data: dict):
+        # progress statuses are coalesced by the publisher, and built only when they are actually sent
+        def progress_status():
+            status = copy.copy(status_object)
+            status.operation = install_op_object(state, mod=to_install_mod, revision=to_install_revision, data=data)
+            return status
+
+        send_status_progress(mod_id, progress_status)
 
     if not get_configuration(CONFIGURATION_KEYS.CS_INSTALL_DIR) or not get_configuration(
             CONFIGURATION_KEYS.CS_DATA_DIR):
@@ -52,7 +71,7 @@ def install_mod(mod_or_id: Union[str, ModBase], revision_id: str, install_deps=F
             "code": "no_path_configuration",
             "message": f"CS folders location not found. Please check your configuration"})
         ws_send_status(status_object)
-        return
+        raise ModOperationError.from_operation(status_object.operation)
 
     # STEP 1: get mod info
     logger.info("STEP 1: get mod info")
@@ -82,7 +101,7 @@ def install_mod(mod_or_id: Union[str, ModBase], revision_id: str, install_deps=F
             "code": "revision_not_found",
             "message": f"Revision not found: {revision_id}"})
         ws_send_status(status_object)
-        return
+        raise ModOperationError.from_operation(status_object.operation)
 
     logger.info(f"Mod name: {to_install_mod.name} - Revision: {to_install_revision.name}")
     try:
@@ -100,7 +119,7 @@ def install_mod(mod_or_id: Union[str, ModBase], revision_id: str, install_deps=F
             })
             status_object.installed = db_mod.installed_revision_association.revision
             ws_send_status(status_object)
-            return
+            raise ModOperationError.from_operation(status_object.operation)
 
         db_revision, is_new = create_revision_if_not_exists(db, to_install_revision, db_mod)
 
@@ -119,14 +138,22 @@ def install_mod(mod_or_id: Union[str, ModBase], revision_id: str, install_deps=F
         # save this information for future accesses
         logger.info("First commit to the database")
         db.commit()
+        status_index.refresh(mod_id)
 
         def rollback():
             logger.info("Rollback: removing the InstalledRevision object from the database")
             db.delete(db_installed_revision)
             db.commit()
+            status_index.refresh(mod_id)
+            if created_folder and os.path.exists(created_folder):
+                logger.info(f"Rollback: removing the installed folder {created_folder}")
+                shutil.rmtree(created_folder, ignore_errors=True)
 
         rollback_fn = rollback
 
+        # from now on, the installation is journaled so it can be recovered if the app dies before its end
+        journal = JobJournal(mod_id, to_install_revision.id, install_deps)
+
         # recreate the status object with new saved information
         status_object = create_status_object(mod_id)
 
@@ -143,36 +170,80 @@ def install_mod(mod_or_id: Union[str, ModBase], revision_id: str, install_deps=F
             ws_send_status(status_object)
 
             logger.info("Generating dependencies tree...")
-            deps = generate_dependency_tree(to_install_mod.id)
+            dependency_graph = resolve_dependencies(to_install_mod.id)
+            deps = dependency_graph.install_order()
             logger.info(f"{len(deps)} dependencies found")
+            if dependency_graph.cycles:
+                logger.warn(f"{len(dependency_graph.cycles)} dependency cycles found and ignored")
             logger.info(f"Installation of {to_install_mod.name} will continue after all the dependencies")
 
             to_install_list: list[tuple[ModBase, ModRevision]] = [(m, m.latest_revision) for m in deps]
             installed_mods = [im.id for im in get_installed_mods() if im.id != mod_id]
 
-            for m, r in to_install_list:
-                # we exclude the to_install_mod from this check,
-                # because here we are interested to the dependencies only
-                # TODO: not necessary anymore, since now to_install_list has only dependencies?
-                if m.id != to_install_mod.id and m.id in installed_mods:
-                    continue  # TODO: check for updates?
+            # we exclude the to_install_mod from this check, because here we are interested to the dependencies only
+            to_install_deps = [(m, r) for m, r in to_install_list
+                               if m.id != to_install_mod.id and m.id not in installed_mods]  # TODO: check for updates?
+
+            dependency_workers = get_configuration_int(CONFIGURATION_KEYS.DEPENDENCY_WORKERS,
+                                                       DEFAULT_DEPENDENCY_WORKERS)
+            logger.info(f"Installing {len(to_install_deps)} dependencies with {dependency_workers} workers")
+            with ThreadPoolExecutor(max_workers=max(dependency_workers, 1),
+                                    thread_name_prefix="install_dependency") as executor:
+                dependency_futures = []
+                for m, r in to_install_deps:
+                    logger.info(f"Installing dependency: {m.name}...")
+                    status_object.operation = install_op_object("installing_dependency", mod=m, revision=r)
+                    ws_send_status(status_object)
 
-                logger.info(f"Installing dependency: {m.name}...")
-                status_object.operation = install_op_object("installing_dependency", mod=m, revision=r)
+                    # RECURSION!
+                    # install_deps is False because the dependency graph already contains all the dependencies,
+                    # in install order
+                    # child is False because each dependency runs into its own worker thread, so it has its own
+                    # scoped session that must be removed when the dependency installation ends
+                    # join_busy is True because if another task is already installing the dependency, we have to wait
+                    # for it before going on
+                    dependency_futures.append(executor.submit(install_mod, m, r.id, install_deps=False, child=False,
+                                                              join_busy=True))
+
+                # wait all the dependencies before continuing
+                for future in dependency_futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.warn(f"Dependency installation failed: {e}")
+
+            # a dependency joined to another task (join_busy) doesn't raise if that task failed, so we check the
+            # status of all of them
+            dependency_statuses = create_status_objects([m.id for m, r in to_install_deps])
+            failed_deps = [m for m, r in to_install_deps
+                           if not dependency_statuses[m.id].installed or dependency_statuses[m.id].installing]
+            if failed_deps:
+                message = f"Dependencies not installed: {', '.join(m.name for m in failed_deps)}"
+                logger.warn(message)
+                status_object.operation = install_op_object("error", mod=to_install_mod, revision=to_install_revision,
+                                                            data={"code": "dependency_failed", "message": message})
                 ws_send_status(status_object)
-
-                # RECURSION!
-                # install_deps is False because this is an half recursion: all dependencies in the dependency tree
-                # have already been recursively added to the "deps" variable -> TODO: make a full recursion?
-                install_mod(m, r.id, install_deps=False, child=True)
-
-                # we add m to the dependencies list of db_mod because here we are sure that install_mod
-                # have created (if necessary) the database entry for m
-                db_m = db.query(Mod).filter_by(id=m.id).first()
-                db_mod.add_dependency(db_m)
+                rollback_fn()
+                raise ModOperationError.from_operation(status_object.operation)
+
+            for dependency_id in dependency_graph.edges[to_install_mod.id]:
+                # we add the direct dependencies to the dependencies list of db_mod because here we are sure that
+                # install_mod have created (if necessary) their database entries. These are read back by the
+                # dependency resolver for installed mods
+                db_m = db.query(Mod).filter_by(id=dependency_id).first()
+                if db_m and db_m not in db_mod.dependencies:
+                    db_mod.add_dependency(db_m)
+
+            # save the dependencies now, so we don't keep the database locked during the next steps
+            db.commit()
 
         # STEP 3: Download revision -> This steps and next ones below will start only when the recursion above
         # have installed all the deps
+        # Steps 3, 4 and 5 are executed by the install pipeline: each step is a stage with its own workers, so while
+        # this revision is unzipped, the revision of another installation can already be downloaded.
+        # Stages don't access the database (except for the journal): everything they need is read here, and their
+        # results are saved below. Stages don't wait either: the retries of a failed download and the wait for a manual
+        # download are done by this thread, that submits the job again.
         logger.info("STEP 3: downloading Revision")
         status_object.operation = install_op_object("get_download_url", mod=to_install_mod,
                                                     revision=to_install_revision)
@@ -184,140 +255,252 @@ def install_mod(mod_or_id: Union[str, ModBase], revision_id: str, install_deps=F
             .filter(DownloadedRevisions.mod_id == to_install_mod.id,
                     DownloadedRevisions.revision_id == to_install_revision.id).first()
 
-        if db_downloaded_revision and os.path.exists(db_downloaded_revision.path):
-            logger.info("Revision already downloaded: skipping step 3")
-            # file already downloaded
-            zip_file_path = db_downloaded_revision.path
-        else:
-            if db_downloaded_revision and not os.path.exists(db_downloaded_revision.path):
-                logger.warn("The Revision seems to be already downloaded, but the file doesn't exists into the "
-                            "filesystem. Downloading it again...")
-                # file removed manually, or wrong path -> delete from database
-                db_mod.downloaded_revisions_association.remove(db_downloaded_revision)
-                db.delete(db_downloaded_revision)
+        # set by the download stage if the revision has been downloaded now: path into the download store, sha256
+        # and size of the archive
+        downloaded_archive = None
+        if db_downloaded_revision and not verify_archive(db_downloaded_revision.path, db_downloaded_revision.sha256,
+                                                         db_downloaded_revision.size):
+            logger.warn("The Revision seems to be already downloaded, but the file doesn't exists into the "
+                        "filesystem or it is corrupted. Downloading it again...")
+            # file removed manually, wrong path or truncated/corrupted file -> delete from database and filesystem
+            if os.path.isfile(db_downloaded_revision.path):
+                os.remove(db_downloaded_revision.path)
+            db_mod.downloaded_revisions_association.remove(db_downloaded_revision)
+            db.delete(db_downloaded_revision)
+            db_downloaded_revision = None
+        elif db_downloaded_revision and db_downloaded_revision.sha256 is None:
+            # archive downloaded before the download store
+            logger.info(f"Moving the archive {db_downloaded_revision.path} into the download store")
+            db_downloaded_revision.path, db_downloaded_revision.sha256, db_downloaded_revision.size = \
+                store_archive(db_downloaded_revision.path)
+            db.commit()
 
-            logger.info("Generating download url...")
-            url = generate_download_url(to_install_revision)
-            if url == 403:
-                logger.info("Server responded with a 403 Unauthorized error. Waiting that the user manually downloads "
-                            "the zip file...")
-                status_object.operation = install_op_object("wait_for_file", mod=to_install_mod,
+        if db_downloaded_revision:
+            db_downloaded_revision.last_access = datetime.datetime.now()
+
+        def retry_callback(attempt, delay, reason):
+            logger.warn(f"Download attempt {attempt} failed ({reason}): retrying in {delay} seconds")
+            status_object.operation = install_op_object("download_retry", mod=to_install_mod,
+                                                        revision=to_install_revision,
+                                                        data={"attempt": attempt, "max_attempts": DOWNLOAD_RETRIES,
+                                                              "delay": delay, "message": reason})
+            ws_send_status(status_object)
+
+        def wait_for_manual_download():
+            logger.info("Server responded with a 403 Unauthorized error. Waiting that the user manually downloads "
+                        "the zip file...")
+            status_object.operation = install_op_object("wait_for_file", mod=to_install_mod,
+                                                        revision=to_install_revision,
+                                                        data={"timeout": 500, "download_folder": download_folder})
+            ws_send_status(status_object)
+            try:
+                return wait_for_file(os.path.join(download_folder, to_install_revision.filename), timeout=500)
+            except TimeoutError:
+                logger.warn("Waiting timeout: the user doesn't have downloaded the file")
+                status_object.operation = install_op_object("error", mod=to_install_mod,
                                                             revision=to_install_revision,
-                                                            data={"timeout": 500, "download_folder": download_folder})
+                                                            data={"code": "timeout",
+                                                                  "message": "File download timeout"})
                 ws_send_status(status_object)
-                try:
-                    zip_file_path = wait_for_file(os.path.join(download_folder, to_install_revision.filename), timeout=500)
-                except TimeoutError:
-                    logger.warn("Waiting timeout: the user doesn't have downloaded the file")
-                    status_object.operation = install_op_object("error", mod=to_install_mod,
-                                                                revision=to_install_revision,
-                                                                data={"code": "timeout",
-                                                                      "message": "File download timeout"})
-                    ws_send_status(status_object)
-                    return
-            elif isinstance(url, int):
+                return None
+
+        # the download url is generated here, so the download stage only downloads the archive
+        download_url = None
+        manual_zip_path = None  # archive downloaded manually by the user, stored by the download stage
+        if not db_downloaded_revision:
+            logger.info("Generating download url...")
+            download_url = generate_download_url(to_install_revision)
+            attempt = 0
+            while download_url in TRANSIENT_HTTP_CODES and attempt < DOWNLOAD_RETRIES:
+                attempt += 1
+                delay = DOWNLOAD_BACKOFF * 2 ** (attempt - 1)
+                retry_callback(attempt, delay, f"Http error during get_download_url: {download_url}")
+                time.sleep(delay)
+                download_url = generate_download_url(to_install_revision)
+
+            if download_url == 403:
+                manual_zip_path = wait_for_manual_download()
+                if not manual_zip_path:
+                    rollback_fn()
+                    raise ModOperationError.from_operation(status_object.operation)
+            elif isinstance(download_url, int):
                 # generic error:
-                logger.error(f"The server responded with a {url} error")
+                logger.error(f"The server responded with a {download_url} error")
                 status_object.operation = install_op_object("error", mod=to_install_mod,
                                                             revision=to_install_revision,
                                                             data={"code": "http_error",
-                                                                  "message": f"Http error during get_download_url: {url}"})
+                                                                  "message": "Http error during get_download_url: "
+                                                                             f"{download_url}"})
                 ws_send_status(status_object)
-                return
+                rollback_fn()
+                raise ModOperationError.from_operation(status_object.operation)
             else:
-                logger.info(f"Download url: {url}")
-
-                def progress_callback(downloaded, total):
-                    status_object.operation = install_op_object("downloading", mod=to_install_mod,
-                                                                revision=to_install_revision,
-                                                                data={"downloaded_bytes": downloaded,
-                                                                      "total_bytes": total})
-                    ws_send_status(status_object)
-
-                def error_callback(http_code, http_message):
-                    logger.error(f"Download stopped with error {http_code}: {http_message}")
-                    status_object.operation = install_op_object("error", mod=to_install_mod,
-                                                                revision=to_install_revision,
-                                                                data={"code": "http_error", "message": http_message,
-                                                                      "http_code": http_code})
-                    ws_send_status(status_object)
-
-                logger.info("Downloading file...")
-                res = download_revision(url, download_folder, progress_callback, error_callback)
-                if res == 403:
-                    logger.info("Server responded with a 403 Unauthorized error. Waiting that the user manually "
-                                "downloads the zip file...")
-                    status_object.operation = install_op_object("wait_for_file", mod=to_install_mod,
-                                                                revision=to_install_revision,
-                                                                data={"timeout": 500, "download_folder": download_folder})
-                    ws_send_status(status_object)
-                    try:
-                        zip_file_path = wait_for_file(os.path.join(download_folder, to_install_revision.filename), timeout=500)
-                    except TimeoutError:
-                        logger.warn("Waiting timeout: the user doesn't have downloaded the file")
-                        status_object.operation = install_op_object("error", mod=to_install_mod,
-                                                                    revision=to_install_revision,
-                                                                    data={"code": "timeout",
-                                                                          "message": "File download timeout"})
-                        ws_send_status(status_object)
-                        return
-                elif isinstance(res, int):
-                    # generic error:
-                    logger.error(f"The server responded with a {url} error")
-                    status_object.operation = install_op_object("error", mod=to_install_mod,
-                                                                revision=to_install_revision,
-                                                                data={"code": "http_error",
-                                                                      "message": f"Http error during downloading: {url}"})
-                    ws_send_status(status_object)
-                    return
-                else:
-                    # file downloaded successfully
-                    logger.info(f"File downloaded successfully to path {res}")
-                    zip_file_path = res
-                    # save the downloaded revision in database
-                    db_mod.add_downloaded(db_revision, zip_file_path)
+                logger.info(f"Download url: {download_url}")
+
+        # set by the download stage when the download fails: http code and message of the error
+        download_error = None
+
+        def download_stage():
+            nonlocal downloaded_archive
+            journal.step(JOB_STEPS.DOWNLOAD)
+            if db_downloaded_revision:
+                logger.info("Revision already downloaded: skipping step 3")
+                # file already downloaded
+                return db_downloaded_revision.path
+
+            zip_file_path = manual_zip_path or download_archive()
+            if not zip_file_path:
+                return None
+
+            downloaded_archive = store_archive(zip_file_path)
+            logger.info(f"Archive stored at path {downloaded_archive[0]}")
+            # journaled now, so the archive is in use (and can't be evicted) before being saved into the database
+            journal.update(zip_path=downloaded_archive[0])
+            return downloaded_archive[0]
+
+        def download_archive():
+            def progress_callback(downloaded, total):
+                ws_send_progress("downloading", {"downloaded_bytes": downloaded, "total_bytes": total})
+                journal.progress(downloaded, total)
+
+            def error_callback(http_code, http_message):
+                nonlocal download_error
+                download_error = (http_code, http_message)
+
+            # the file is downloaded into a .part file, journaled so an interrupted download can be resumed
+            zip_file_path = os.path.join(download_folder, to_install_revision.filename)
+            journal.update(work_path=part_path(zip_file_path))
+
+            logger.info("Downloading file...")
+            # no retries here: a failed download is retried by the installation thread (see below), so the stage
+            # worker doesn't sleep during the backoff
+            res = download_file(download_url, zip_file_path, progress_callback, error_callback, retries=0)
+            if isinstance(res, int):
+                return None
+
+            # file downloaded successfully
+            logger.info(f"File downloaded successfully to path {res}")
+            return res
 
         # STEP 4: Unzip
-        logger.info("STEP 4: unzip")
-        if not isinstance(zip_file_path, str) or not os.path.exists(zip_file_path):
-            logger.warn(f"No zip file found at path {zip_file_path}")
-            status_object.operation = install_op_object("error", mod=to_install_mod, revision=to_install_revision,
-                                                        data={"code": "zip_error",
-                                                              "message": "Zip file not found"})
-            ws_send_status(status_object)
-            return
+        target_folder = get_asset_target_folder(to_install_mod)
+        install_mode = get_configuration(CONFIGURATION_KEYS.INSTALL_MODE)
+        install_mode = install_mode.value if install_mode and install_mode.value else INSTALL_MODES.DIRECT
+        copy_workers = get_configuration_int(CONFIGURATION_KEYS.COPY_WORKERS, DEFAULT_COPY_WORKERS)
+
+        def unzip_callback(extracted, total):
+            ws_send_progress("unzip", {"extracted_bytes": extracted, "total_bytes": total})
+            journal.progress(extracted, total)
+
+        def extract_stage(zip_file_path):
+            nonlocal tmpdir
+            logger.info("STEP 4: unzip")
+            if not isinstance(zip_file_path, str) or not os.path.exists(zip_file_path):
+                logger.warn(f"No zip file found at path {zip_file_path}")
+                status_object.operation = install_op_object("error", mod=to_install_mod, revision=to_install_revision,
+                                                            data={"code": "zip_error",
+                                                                  "message": "Zip file not found"})
+                ws_send_status(status_object)
+                return None
 
-        status_object.operation = install_op_object("unzip", mod=to_install_mod, revision=to_install_revision)
-        ws_send_status(status_object)
+            status_object.operation = install_op_object("unzip", mod=to_install_mod, revision=to_install_revision)
+            ws_send_status(status_object)
 
-        unzipped_folder_path = unzip(zip_file_path, tmpdir)
-        logger.info(f"File successfully unzipped at path {tmpdir}")
+            if install_mode == INSTALL_MODES.DIRECT:
+                # the zip is extracted into a staging folder inside the target folder, that the install stage moves
+                # into place, so we don't have to copy the files a second time
+                logger.info(f"Install mode {install_mode}: unzipping directly into the target folder {target_folder}")
+                staging_folder = create_staging_folder(target_folder)
+                journal.step(JOB_STEPS.UNZIP, zip_path=zip_file_path, work_path=staging_folder,
+                             install_mode=install_mode)
+                return unzip_staged(zip_file_path, target_folder, callback=unzip_callback,
+                                    staging_folder=staging_folder)
+
+            tmpdir = mkdtemp(prefix="smods_manager-")
+            journal.step(JOB_STEPS.UNZIP, zip_path=zip_file_path, work_path=tmpdir, install_mode=install_mode)
+            unzip(zip_file_path, tmpdir, callback=unzip_callback)
+            logger.info(f"File successfully unzipped at path {tmpdir}")
+            return tmpdir
 
         # STEP 5 Install
-        logger.info("STEP 5: install")
-        status_object.operation = install_op_object("copying", mod=to_install_mod, revision=to_install_revision)
-        ws_send_status(status_object)
+        def install_stage(extracted):
+            nonlocal created_folder
+            logger.info("STEP 5: install")
+            if install_mode == INSTALL_MODES.DIRECT:
+                staging_folder, unzipped_folder_path = extracted
+                destination = os.path.join(target_folder, os.path.basename(unzipped_folder_path))
+                journal.step(JOB_STEPS.COPY, created_path=None if os.path.exists(destination) else destination)
+                installed_path, created = move_staged(staging_folder, unzipped_folder_path, target_folder)
+                if created:
+                    created_folder = installed_path
+                return installed_path
+
+            status_object.operation = install_op_object("copying", mod=to_install_mod, revision=to_install_revision)
+            ws_send_status(status_object)
 
-        target_folder = get_asset_target_folder(to_install_mod)
+            # we get unzipped folder name to save it to the database
+            root, dirs, files = next(os.walk(extracted))
+            unzipped_folder_name = dirs[0]
+            destination = os.path.join(target_folder, unzipped_folder_name)
+            if not os.path.exists(destination):
+                created_folder = destination
+            journal.step(JOB_STEPS.COPY, created_path=created_folder)
+
+            def copy_callback(copied, total):
+                ws_send_progress("copying", {"copied_bytes": copied, "total_bytes": total})
+                journal.progress(copied, total)
+
+            logger.info(f"Target folder: {target_folder} - copy workers: {copy_workers}")
+            copydir(extracted, target_folder, callback=copy_callback, workers=copy_workers)
+            return destination
+
+        download_attempt = 0
+        while True:
+            download_error = None
+            installed_path = get_install_pipeline().submit(download_stage, extract_stage, install_stage).result()
+            if installed_path or not download_error:
+                # installed, or stopped by a stage that has already notified the error
+                break
+
+            http_code, http_message = download_error
+            if http_code == 403:
+                # the user can download the file manually, then the job is submitted again to store it
+                manual_zip_path = wait_for_manual_download()
+                if not manual_zip_path:
+                    break
+            elif (http_code in TRANSIENT_HTTP_CODES or http_code == NETWORK_ERROR) \
+                    and download_attempt < DOWNLOAD_RETRIES:
+                # the job is submitted again after the backoff, resuming the .part file
+                download_attempt += 1
+                delay = min(DOWNLOAD_BACKOFF * 2 ** (download_attempt - 1), DOWNLOAD_MAX_BACKOFF)
+                retry_callback(download_attempt, delay, http_message)
+                time.sleep(delay)
+            else:
+                logger.error(f"Download stopped with error {http_code}: {http_message}")
+                status_object.operation = install_op_object("error", mod=to_install_mod,
+                                                            revision=to_install_revision,
+                                                            data={"code": "http_error", "message": http_message,
+                                                                  "http_code": http_code})
+                ws_send_status(status_object)
+                break
 
-        # we get unzipped folder name to save it to the database
-        root, dirs, files = next(os.walk(tmpdir))
-        unzipped_folder_name = dirs[0]
+        if not installed_path:
+            # a stage stopped the installation, and it has already notified the error
+            rollback_fn()
+            raise ModOperationError.from_operation(status_object.operation)
 
-        def copy_callback(copied, total):
-            status_object.operation = install_op_object("copying", mod=to_install_mod, revision=to_install_revision,
-                                                        data={"copied_bytes": copied, "total_bytes": total})
-            ws_send_status(status_object)
+        if downloaded_archive:
+            # save the downloaded revision in database
+            db_mod.add_downloaded(db_revision, *downloaded_archive)
 
-        logger.info(f"Target folder: {target_folder}")
-        copydir(tmpdir, target_folder, callback=copy_callback)
-        db_installed_revision.path = os.path.join(target_folder, unzipped_folder_name)
+        db_installed_revision.path = installed_path
         db_installed_revision.status = "installed"
         # DONE!
         logger.info(f"Revision successfully installed at path {db_installed_revision.path}")
 
         # save all the changes to the database
         db.commit()
+        status_index.refresh(mod_id)
 
         # we recreate the status object one last time with the information just saved into the database
         status_object = create_status_object(mod_id)
@@ -326,54 +509,57 @@ def install_mod(mod_or_id: Union[str, ModBase], revision_id: str, install_deps=F
         ws_send_status(status_object)
         logger.info("Install completed")
 
+        if downloaded_archive:
+            # the installation is completed: a failure here must not roll it back
+            try:
+                evict_archives()
+            except Exception as e:
+                logger.warn(f"Cannot evict the download cache: {e}")
+
     # except ConnectionAbortedError:
     #     # don't stop in case of websocket error
     #     logger.warn("WebSocket connection error. Trying to continue without the ws")
     #     pass
+    except ModOperationError:
+        # already notified (and rolled back)
+        db.rollback()
+        raise
     except Exception as e:
         logger.error("An error have occurred", e)
         db.rollback()
         if rollback_fn:
             rollback_fn()
 
-            try:
-                status_object.operation = install_op_object("error", mod=to_install_mod, revision=to_install_revision,
-                                                            data={"code": "exception", "message": str(e)})
-                ws_send_status(status_object)
-            except ConnectionAbortedError:
-                # don't stop in case of websocket error
-                pass
+            status_object.operation = install_op_object("error", mod=to_install_mod, revision=to_install_revision,
+                                                        data={"code": "exception", "message": str(e)})
+            ws_send_status(status_object)
         raise
     finally:
         logger.info("Closing resources and deleting temporary folders...")
-        if ws:
-            ws.close()
+        if journal:
+            journal.finish()
         if not child:
             # TODO: find a better approach to close the scoped session when the recursion ends.
             # For now, we use a parameter "child" that is False only for the first iteration, but if the caller change
             # the value of this parameter, the function broke
             SSession.remove()
-        if os.path.exists(tmpdir):
+        if tmpdir and os.path.exists(tmpdir):
             shutil.rmtree(tmpdir, ignore_errors=True)
 
 
+@mod_operation("uninstall")
 def uninstall_mod(mod_or_id: Union[str, ModBase]):
     mod_id = mod_or_id.id if isinstance(mod_or_id, ModBase) else mod_or_id
-    ws, db = None, None
+    db = None
 
     status_object = create_status_object(mod_id)
     uninstall_op_object = partial(op_state, "uninstall")
-    ws_send_status = None
+    ws_send_status = partial(send_status, mod_id)
 
     logger.info(f"Uninstalling mod {mod_id}")
     try:
         logger.info("Connecting to the database...")
         db = Session(engine)
-        print("Connecting to the WebSocket")
-        ws = websocket.create_connection("ws://localhost:5001")
-
-        ws_send_status = partial(send_status, ws, mod_id)
-
         logger.info("Getting mod info")
         status_object.operation = uninstall_op_object("get_mod_info")
         ws_send_status(status_object)
@@ -386,7 +572,7 @@ def uninstall_mod(mod_or_id: Union[str, ModBase]):
                 "message": f"Mod not found: {mod_id}"
             })
             ws_send_status(status_object)
-            return
+            raise ModOperationError.from_operation(status_object.operation)
 
         if not db_mod.installed_revision_association:
             logger.warn(f"No installed revision for Mod with id {mod_id}")
@@ -395,7 +581,7 @@ def uninstall_mod(mod_or_id: Union[str, ModBase]):
                 "message": f"No installed revision for Mod: {mod_id}"
             })
             ws_send_status(status_object)
-            return
+            raise ModOperationError.from_operation(status_object.operation)
 
         ir = db_mod.installed_revision_association
 
@@ -415,6 +601,7 @@ def uninstall_mod(mod_or_id: Union[str, ModBase]):
         db.delete(ir)
 
         db.commit()
+        status_index.refresh(mod_id)
 
         # done
 
@@ -423,24 +610,16 @@ def uninstall_mod(mod_or_id: Union[str, ModBase]):
         status_object.operation = uninstall_op_object("done")
         ws_send_status(status_object)
         logger.info("Uninstall completed")
-    except ConnectionAbortedError:
-        # don't stop in case of websocket error
-        logger.warn("WebSocket connection error. Trying to continue without the ws")
-        pass
+    except ModOperationError:
+        raise
     except Exception as e:
         logger.error("An error have happened", e)
-        db.rollback()
-        if ws_send_status:
-            try:
-                status_object.operation = uninstall_op_object("error", data={"code": "exception", "message": str(e)})
-                ws_send_status(status_object)
-            except ConnectionAbortedError:
-                # don't stop in case of websocket error
-                pass
+        if db:
+            db.rollback()
+        status_object.operation = uninstall_op_object("error", data={"code": "exception", "message": str(e)})
+        ws_send_status(status_object)
         raise
     finally:
         logger.info("Closing resources...")
-        if ws:
-            ws.close()
         if db:
             db.close()
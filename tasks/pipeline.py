@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import Future
+from queue import Queue
+from typing import Callable, Any
+
+from db.app import get_configuration_int, CONFIGURATION_KEYS, DEFAULT_PIPELINE_DOWNLOAD_WORKERS, \
+    DEFAULT_PIPELINE_EXTRACT_WORKERS, DEFAULT_PIPELINE_INSTALL_WORKERS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PIPELINE_QUEUE_SIZE = 2
+
+
+class PipelineJob(object):
+    """
+    A job flowing through the pipeline. Each stage function receives the result of the previous stage (the first one
+    receives nothing). If a stage returns None the job stops, and its future is resolved with None.
+    """
+    def __init__(self, stages: list[Callable[..., Any]]):
+        self.stages = stages
+        self.result = None
+        self.future = Future()
+
+
+class PipelineStage(object):
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.queue: Queue[tuple[int, PipelineJob]] = Queue(maxsize=queue_size)
+        self.next_stage: PipelineStage | None = None
+
+        for i in range(max(workers, 1)):
+            thread = threading.Thread(target=self._work, name=f"pipeline-{name}-{i}", daemon=True)
+            thread.start()
+
+    def put(self, index: int, job: PipelineJob):
+        # blocks when the queue is full, so a fast stage can't run too far ahead of a slow one
+        self.queue.put((index, job))
+
+    def _work(self):
+        while True:
+            index, job = self.queue.get()
+            try:
+                result = job.stages[index]() if index == 0 else job.stages[index](job.result)
+            except Exception as e:
+                logger.error(f"Pipeline stage {self.name} failed", exc_info=e)
+                job.future.set_exception(e)
+                continue
+            finally:
+                self.queue.task_done()
+
+            if result is None or not self.next_stage:
+                job.future.set_result(result)
+            else:
+                job.result = result
+                self.next_stage.put(index + 1, job)
+
+
+class InstallPipeline(object):
+    """
+    Three stages pipeline (download -> extract -> install). Each stage has its own workers and a bounded queue, so
+    stages of different jobs overlap: while an archive is being extracted, the next one is already downloading.
+    """
+    def __init__(self, download_workers: int, extract_workers: int, install_workers: int,
+                 queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.download = PipelineStage("download", download_workers, queue_size)
+        self.extract = PipelineStage("extract", extract_workers, queue_size)
+        self.install = PipelineStage("install", install_workers, queue_size)
+
+        self.download.next_stage = self.extract
+        self.extract.next_stage = self.install
+
+    def submit(self, download: Callable[[], Any], extract: Callable[[Any], Any],
+               install: Callable[[Any], Any]) -> Future:
+        job = PipelineJob([download, extract, install])
+        self.download.put(0, job)
+        return job.future
+
+
+_pipeline: InstallPipeline | None = None
+_pipeline_lock = threading.Lock()
+
+
+def get_install_pipeline() -> InstallPipeline:
+    global _pipeline
+    with _pipeline_lock:
+        if not _pipeline:
+            _pipeline = InstallPipeline(
+                get_configuration_int(CONFIGURATION_KEYS.PIPELINE_DOWNLOAD_WORKERS, DEFAULT_PIPELINE_DOWNLOAD_WORKERS),
+                get_configuration_int(CONFIGURATION_KEYS.PIPELINE_EXTRACT_WORKERS, DEFAULT_PIPELINE_EXTRACT_WORKERS),
+                get_configuration_int(CONFIGURATION_KEYS.PIPELINE_INSTALL_WORKERS, DEFAULT_PIPELINE_INSTALL_WORKERS))
+
+        return _pipeline
@@ -0,0 +1,120 @@
+import threading
+
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from db import engine
+from db.model import Mod, InstalledRevisions, DownloadedRevisions, ModsPlaylists, ModRevision
+from smods_websocket.model import ModStatus
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _revision_info(revision: ModRevision) -> dict:
+    # plain copy of the revision, so the index doesn't keep references to objects detached from their session
+    return {
+        "id": revision.id,
+        "name": revision.name,
+        "date": revision.date,
+        "download_url": revision.download_url,
+        "filename": revision.filename
+    }
+
+
+def _status_from_db_mod(db_mod: Mod | None) -> ModStatus:
+    installed = None
+    installing = False
+    downloaded = None
+    starred = False
+    playlists = []
+
+    if db_mod:
+        # installed / installing
+        if db_mod.installed_revision_association:
+            installed = _revision_info(db_mod.installed_revision_association.revision)
+            if db_mod.installed_revision_association.status.lower() == "installing":
+                installing = True
+
+        # downloaded
+        if db_mod.downloaded_revisions_association:
+            downloaded = []
+            for dr in db_mod.downloaded_revisions_association:
+                downloaded.append(_revision_info(dr.revision))
+
+        # starred / playlists
+        for pa in db_mod.playlists_association:
+            if pa.playlist.id == 0:  # playlist 0 is starred mods
+                starred = True
+            else:
+                playlists.append({"id": pa.playlist.id, "name": pa.playlist.name})
+
+    return ModStatus(installed=installed, downloaded=downloaded, starred=starred, playlists=playlists,
+                     installing=installing)
+
+
+def _status_query(db: Session):
+    # everything needed by the status object is eagerly loaded, so the query count doesn't depend on the number of mods
+    return db.query(Mod).options(
+        joinedload(Mod.installed_revision_association).joinedload(InstalledRevisions.revision),
+        selectinload(Mod.downloaded_revisions_association).joinedload(DownloadedRevisions.revision),
+        selectinload(Mod.playlists_association).joinedload(ModsPlaylists.playlist))
+
+
+class StatusIndex(object):
+    """
+    Process-wide, in memory index mod id -> ModStatus. It is loaded from the database once, then each task that
+    changes the status of a mod (install, uninstall) must call refresh after its commits, so reads never hit the
+    database.
+    """
+    def __init__(self):
+        self._statuses: dict[str, ModStatus] = {}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def load(self):
+        with self._lock, Session(engine) as db:
+            self._statuses = {db_mod.id: _status_from_db_mod(db_mod) for db_mod in _status_query(db).all()}
+            self._loaded = True
+            logger.info(f"Status index loaded: {len(self._statuses)} mods")
+
+    def refresh(self, *mod_ids: str):
+        """
+        Reloads from the database the status of the given mods
+        """
+        with self._lock:
+            if not self._loaded:
+                self.load()
+                return
+
+        with self._lock, Session(engine) as db:
+            db_mods = {db_mod.id: db_mod for db_mod in _status_query(db).filter(Mod.id.in_(mod_ids)).all()}
+            for mod_id in mod_ids:
+                if mod_id in db_mods:
+                    self._statuses[mod_id] = _status_from_db_mod(db_mods[mod_id])
+                else:
+                    self._statuses.pop(mod_id, None)
+
+    def get(self, mod_id: str) -> ModStatus:
+        return self.get_many([mod_id])[mod_id]
+
+    def get_many(self, mod_ids: list[str]) -> dict[str, ModStatus]:
+        """
+        Returns a copy of the statuses of the given mods, that the caller can freely change
+        """
+        with self._lock:
+            if not self._loaded:
+                self.load()
+
+            return {mod_id: self._copy(self._statuses.get(mod_id)) for mod_id in mod_ids}
+
+    @staticmethod
+    def _copy(status: ModStatus | None) -> ModStatus:
+        if not status:
+            return ModStatus(installed=None, downloaded=None)
+
+        return ModStatus(installed=status.installed,
+                         downloaded=list(status.downloaded) if status.downloaded else status.downloaded,
+                         starred=status.starred, playlists=list(status.playlists), installing=status.installing)
+
+
+status_index = StatusIndex()
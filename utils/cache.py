@@ -0,0 +1,146 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+
+class TTLCache(object):
+    """
+    Thread safe, size bounded cache. Entries expire ttl seconds after they have been set, and when the cache is full
+    the least recently used entry is evicted.
+    """
+    def __init__(self, name: str, ttl: float, maxsize: int):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry is not _MISSING:
+                # expired
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key: only the first caller executes the function, the others wait for
+    its result (or its exception).
+    """
+    def __init__(self):
+        self.shared = 0  # calls that have been served by another in-flight call
+
+        self._calls: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = Future()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn(*args, **kwargs)
+            call.set_result(result)
+            return result
+        except Exception as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+caches: dict[str, TTLCache] = {}
+_flights: dict[str, SingleFlight] = {}
+
+
+def cached(name: str, ttl: float, maxsize: int = 256, key: Callable[..., Hashable] = None):
+    """
+    Decorator that caches the results of the decorated function into a TTLCache registered with the given name.
+    The cache key is built by the key function (called with the same arguments of the decorated function), or
+    from the arguments themselves if key is None. None results are not cached.
+    Concurrent cache misses for the same key are coalesced into a single call of the decorated function.
+    """
+    cache = caches.setdefault(name, TTLCache(name, ttl, maxsize))
+    flight = _flights.setdefault(name, SingleFlight())
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            value = cache.get(cache_key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            def fetch():
+                result = fn(*args, **kwargs)
+                if result is not None:
+                    cache.set(cache_key, result)
+                return result
+
+            return flight.do(cache_key, fetch)
+
+        wrapper.cache = cache
+        wrapper.flight = flight
+        return wrapper
+
+    return decorator
+
+
+def caches_stats() -> list[dict]:
+    return [cache.stats() | {"shared": _flights[name].shared if name in _flights else 0}
+            for name, cache in caches.items()]
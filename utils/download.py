@@ -0,0 +1,126 @@
+import os
+import re
+import time
+from typing import Callable
+
+import cloudscraper
+import requests
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = 30  # seconds without receiving data before the connection is considered lost
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_BACKOFF = 1  # seconds before the first retry, doubled at each retry
+DOWNLOAD_MAX_BACKOFF = 60
+
+PART_SUFFIX = ".part"
+
+# http codes that may disappear retrying the request later
+TRANSIENT_HTTP_CODES = {408, 425, 429, 500, 502, 503, 504}
+NETWORK_ERROR = 0  # returned (and passed to the error callback) when the server can't be reached
+
+
+class _TransientError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def part_path(path: str) -> str:
+    return path + PART_SUFFIX
+
+
+def _content_range_total(content_range: str | None) -> int | None:
+    # Content-Range: bytes 100-199/1000 or bytes */1000
+    match = re.match(r"bytes (?:\d+-\d+|\*)/(\d+)", content_range or "")
+    return int(match.group(1)) if match else None
+
+
+def _download_part(session: requests.Session, url: str, path: str, callback: Callable[[int, int], None] = None) \
+        -> int | None:
+    """
+    Downloads url into the .part file of path, resuming it if it already exists. Returns None when the download is
+    complete, or the http code of a non-transient error. Raises _TransientError for errors that should be retried.
+    """
+    partial = part_path(path)
+    downloaded = os.path.getsize(partial) if os.path.exists(partial) else 0
+    headers = {"Range": f"bytes={downloaded}-"} if downloaded else {}
+
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as res:
+            if res.status_code == 416:
+                # range not satisfiable: the part file is already complete, or it is not valid anymore
+                total = _content_range_total(res.headers.get("Content-Range"))
+                if total is not None and total == downloaded:
+                    return None
+                os.remove(partial)
+                raise _TransientError(416, "Invalid partial download, restarting it")
+            if res.status_code in TRANSIENT_HTTP_CODES:
+                raise _TransientError(res.status_code, f"{res.status_code} {res.reason}")
+            if res.status_code >= 400:
+                return res.status_code
+
+            if res.status_code == 206:
+                total = _content_range_total(res.headers.get("Content-Range"))
+                mode = "ab"
+            else:
+                # the server doesn't support ranges (or we didn't ask for them): start from the beginning
+                total = int(res.headers["Content-Length"]) if "Content-Length" in res.headers else None
+                downloaded = 0
+                mode = "wb"
+
+            with open(partial, mode) as f:
+                for chunk in res.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    downloaded += len(chunk)
+                    if callback:
+                        callback(downloaded, total or downloaded)
+    except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+        # the bytes received until now are kept into the part file, and the next attempt will resume from them
+        raise _TransientError(NETWORK_ERROR, str(e))
+
+    if total is not None and downloaded < total:
+        raise _TransientError(NETWORK_ERROR, f"Connection closed after {downloaded} of {total} bytes")
+
+    return None
+
+
+def download_file(url: str, path: str, callback: Callable[[int, int], None] = None,
+                  error_callback: Callable[[int, str], None] = None,
+                  retry_callback: Callable[[int, float, str], None] = None,
+                  retries: int = DOWNLOAD_RETRIES, backoff: float = DOWNLOAD_BACKOFF,
+                  session: requests.Session = None) -> str | int:
+    """
+    Downloads url to path, writing the data into a .part file that is renamed to path when the download completes.
+    If the .part file already exists (e.g. an interrupted download), the download is resumed with an HTTP Range
+    request. Network errors and transient http errors are retried up to retries times, waiting backoff seconds before
+    the first retry and doubling the wait at each next one.
+    Returns path on success, otherwise the http code of the error (NETWORK_ERROR if the server can't be reached),
+    like smodslib.download.download_revision.
+    callback is called with the downloaded bytes and the total bytes, error_callback with the http code and message of
+    the error that stopped the download, and retry_callback with the attempt number, the seconds before the retry
+    and the reason of the retry.
+    """
+    session = session or cloudscraper.create_scraper()
+    attempt = 0
+    while True:
+        try:
+            code = _download_part(session, url, path, callback)
+            if code is None:
+                os.replace(part_path(path), path)
+                return path
+
+            if error_callback:
+                error_callback(code, f"Http error {code} during downloading: {url}")
+            return code
+        except _TransientError as e:
+            attempt += 1
+            if attempt > retries:
+                if error_callback:
+                    error_callback(e.code, e.message)
+                return e.code
+
+            delay = min(backoff * 2 ** (attempt - 1), DOWNLOAD_MAX_BACKOFF)
+            if retry_callback:
+                retry_callback(attempt, delay, e.message)
+            time.sleep(delay)
@@ -1,12 +1,17 @@
-import functools
+import hashlib
 import os
+import threading
 import time
 import winreg
 from pathlib import Path
-from shutil import copy2, copytree
+from concurrent.futures import ThreadPoolExecutor
+from shutil import copy2, copytree, copystat, copyfileobj, rmtree
+from tempfile import mkdtemp
 from typing import Callable, Union
 from zipfile import ZipFile
 
+UNZIP_BUFFER_SIZE = 1024 * 1024
+
 
 def folder_size(path):
     # https://stackoverflow.com/questions/1392413/calculating-a-directorys-size-using-python
@@ -15,43 +20,183 @@ def folder_size(path):
     return sum(f.stat().st_size for f in root_directory.glob('**/*') if f.is_file())
 
 
-def copydir(src: str, dest: str, callback: Callable[[int, int], None] = None):
-    root, dirs, files = next(os.walk(src))
-    copying_folder = dirs[0] if dirs else None
+def files_size(path) -> dict[str, int]:
+    """
+    Returns a dictionary mapping each file under path to its size in bytes. Keys are built with os.path.join, like the
+    paths that shutil.copytree passes to its copy_function.
+    """
+    sizes = {}
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            file_path = os.path.join(root, f)
+            sizes[file_path] = os.path.getsize(file_path)
+
+    return sizes
+
+
+def file_sha256(path: str, buffer_size: int = UNZIP_BUFFER_SIZE) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(buffer_size):
+            sha256.update(chunk)
 
-    total = folder_size(src)
+    return sha256.hexdigest()
 
-    def copy2_callback(total_size, s, d):
-        from utils.logger import get_logger
-        logger = get_logger(__name__)
+
+def copydir(src: str, dest: str, callback: Callable[[int, int], None] = None, workers: int = 1,
+            parallel_threshold: int = 64):
+    """
+    Copy the src folder content into dest. If workers is greater than 1 and the src folder has at least
+    parallel_threshold files, files are copied concurrently by a pool of workers threads.
+    """
+    # sizes are collected once before the copy, so the progress can be tracked with a running counter instead of
+    # re-walking the destination folder after each copied file
+    sizes = files_size(src)
+    total = sum(sizes.values())
+    copied = 0
+    copied_lock = threading.Lock()
+
+    def copy2_callback(s, d):
+        nonlocal copied
         copy2(s, d)
 
-        if copying_folder:
-            logger.debug(f"Generating folder size for path {os.path.join(dest, copying_folder)}")
-            copied_size = folder_size(os.path.join(dest, copying_folder))
-            logger.debug(f"{copied_size}")
-            if callback:
-                try:
-                    callback(copied_size, total_size)
-                except Exception:
-                    # continue copy in case of exception into the callback function
-                    pass
+        size = sizes.get(s)
+        with copied_lock:
+            copied += size if size is not None else os.path.getsize(d)
+            current = copied
+
+        if callback:
+            try:
+                callback(current, total)
+            except Exception:
+                # continue copy in case of exception into the callback function
+                pass
+
+    if workers <= 1 or len(sizes) < parallel_threshold:
+        return copytree(src, dest, copy_function=copy2_callback, dirs_exist_ok=True)
+
+    # directories are created before starting the workers (os.walk is top-down), so each worker can copy its file
+    # without caring about the parent folder
+    to_copy = []
+    for root, dirs, files in os.walk(src):
+        target_root = os.path.join(dest, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+        for f in files:
+            to_copy.append((os.path.join(root, f), os.path.join(target_root, f)))
 
-    copy_fn: Callable[[str, str], None] = functools.partial(copy2_callback, total)
-    return copytree(src, dest, copy_function=copy_fn, dirs_exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="copydir") as executor:
+        futures = [executor.submit(copy2_callback, s, d) for s, d in to_copy]
+        for future in futures:
+            future.result()  # re-raise the first copy error, if any
 
+    for root, dirs, files in os.walk(src):
+        # same as copytree, copy the folders' metadata after their content
+        copystat(root, os.path.join(dest, os.path.relpath(root, src)))
 
-def unzip(zip_path: str, dest_path: str) -> str:
+    return dest
+
+
+def unzip(zip_path: str, dest_path: str, callback: Callable[[int, int], None] = None,
+          callback_interval: float = 0.5, buffer_size: int = UNZIP_BUFFER_SIZE) -> str:
     """
     Unzip the zip at zip_path insto dest_path. Returns the path to the unzipped folder.
+    Members are streamed to the disk with a buffer of buffer_size bytes. If callback is passed, it is called with the
+    uncompressed bytes extracted so far and the total uncompressed size, at most once every callback_interval seconds
+    (and always when the extraction ends).
     """
+    dest_root = os.path.realpath(dest_path)
     with ZipFile(zip_path, 'r') as zip_ref:
-        zip_root_folder = zip_ref.filelist[0].filename
-        zip_ref.extractall(dest_path)
+        members = zip_ref.infolist()
+        # the first folder at the root of the zip: the root can also contain other folders or files (e.g. a readme)
+        zip_root_folder = next((member.filename.split("/")[0] for member in members if "/" in member.filename),
+                               members[0].filename.split("/")[0])
+        total = sum(member.file_size for member in members)
+        extracted = 0
+        last_callback = 0
+
+        for member in members:
+            target_path = os.path.realpath(os.path.join(dest_root, member.filename))
+            if os.path.commonpath([dest_root, target_path]) != dest_root:
+                raise ValueError(f"Zip member {member.filename} would be extracted outside {dest_path}")
+
+            if member.is_dir():
+                os.makedirs(target_path, exist_ok=True)
+                continue
+
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with zip_ref.open(member) as source, open(target_path, "wb") as target:
+                copyfileobj(source, target, buffer_size)
+
+            extracted += member.file_size
+            if callback and time.monotonic() - last_callback >= callback_interval:
+                last_callback = time.monotonic()
+                try:
+                    callback(extracted, total)
+                except Exception:
+                    # continue unzip in case of exception into the callback function
+                    pass
+
+        if callback:
+            try:
+                callback(extracted, total)
+            except Exception:
+                pass
 
     return os.path.join(dest_path, zip_root_folder)
 
 
+def create_staging_folder(target_folder: str) -> str:
+    """
+    Creates a new staging folder inside target_folder (i.e. on the same filesystem)
+    """
+    Path(target_folder).mkdir(parents=True, exist_ok=True)
+    return mkdtemp(prefix=".smods_manager-", dir=target_folder)
+
+
+def unzip_staged(zip_path: str, target_folder: str, callback: Callable[[int, int], None] = None,
+                 staging_folder: str = None) -> tuple[str, str]:
+    """
+    Unzip the zip at zip_path into a staging folder created inside target_folder (i.e. on the same filesystem), or
+    into staging_folder if it has already been created with create_staging_folder.
+    Returns the path to the staging folder and the path to the unzipped folder, that must be passed to move_staged.
+    The callback is forwarded to unzip.
+    """
+    staging_folder = staging_folder or create_staging_folder(target_folder)
+
+    try:
+        return staging_folder, unzip(zip_path, staging_folder, callback=callback)
+    except Exception:
+        rmtree(staging_folder, ignore_errors=True)
+        raise
+
+
+def move_staged(staging_folder: str, unzipped_folder_path: str, target_folder: str) -> tuple[str, bool]:
+    """
+    Atomically rename the unzipped folder generated by unzip_staged into target_folder, then remove the staging folder.
+    If a folder with the same name already exists into target_folder, the unzipped content is merged into it.
+    If the zip root contains other folders or files besides the unzipped folder, the whole staging folder content is
+    copied into target_folder instead (like the copy install mode), so none of them is lost.
+    Returns the path to the installed folder and True if the folder has been created, False if it has been merged into
+    an existing one.
+    """
+    try:
+        installed_path = os.path.join(target_folder, os.path.basename(unzipped_folder_path))
+
+        if len(os.listdir(staging_folder)) > 1 or not os.path.isdir(unzipped_folder_path):
+            created = not os.path.exists(installed_path)
+            copydir(staging_folder, target_folder)
+            return installed_path, created
+
+        if os.path.exists(installed_path):
+            copydir(unzipped_folder_path, installed_path)
+            return installed_path, False
+
+        os.replace(unzipped_folder_path, installed_path)
+        return installed_path, True
+    finally:
+        rmtree(staging_folder, ignore_errors=True)
+
+
 def wait_for_file(path: str, timeout: int = 120) -> str:
     """
     Wait until a file exists in a folder, or until timeout time exceed